@@ -79,7 +79,7 @@ for ent in doc.ents:
     if ent.label_ in ["PER"]:
         try:
             start_ind = view.get_table_pos(ent.start_char)
-            end_ind = view.get_table_pos(ent.end_char+1)
+            end_ind = view.get_table_pos(ent.end_char-1)+1
 
             so.add_inline(
                 begin=start_ind,
@@ -0,0 +1,46 @@
+"""Compare the construction of the position table from an etree: the recursive
+`flatten_tree` + `flat_tree2position_table` against the iterative `tree2position_table`.
+
+usage: python benchmark_table_builder.py [number of paragraphs]
+"""
+import sys
+import time
+
+from lxml import etree
+from standoffconverter.converters import flatten_tree, flat_tree2position_table, tree2position_table
+
+
+def create_tei(n_paragraphs):
+    paragraph = (
+        "<p>Lorem <hi rend='italic'>ipsum</hi> dolor sit amet,<lb/> consectetur "
+        "<note type='editorial'>adipiscing <ref target='#x'>elit</ref></note>, sed do "
+        "<persName>eiusmod</persName> tempor<!-- comment --> incididunt.</p>\n"
+    )
+    xml = "<TEI><teiHeader/><text><body>" + paragraph * n_paragraphs + "</body></text></TEI>"
+    return etree.fromstring(xml).find(".//text")
+
+
+def measure(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+
+    n_paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    text_el = create_tei(n_paragraphs)
+
+    recursive_time, recursive_table = measure(lambda: flat_tree2position_table(flatten_tree(text_el)))
+    iterative_time, iterative_table = measure(lambda: tree2position_table(text_el))
+
+    assert recursive_table.df.drop(columns="el").equals(iterative_table.df.drop(columns="el"))
+
+    print(f"{len(iterative_table)} rows")
+    print(f"flatten_tree + flat_tree2position_table: {recursive_time:.3f}s")
+    print(f"tree2position_table:                     {iterative_time:.3f}s")
+    print(f"speedup: {recursive_time / iterative_time:.1f}x")
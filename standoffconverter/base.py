@@ -1,9 +1,31 @@
 import numpy as np
 import pandas as pd
 from copy import copy as sc
+from lxml import etree
 
 from .utils import strip_ns, is_empty_el
 
+COLUMNS = ["position", "row_type", "el", "depth", "text"]
+
+# codes of the row types in typed columns
+ROW_TYPES = ["open", "close", "empty", "text"]
+OPEN, CLOSE, EMPTY, TEXT = range(len(ROW_TYPES))
+ROW_TYPE_CODES = {row_type: code for code, row_type in enumerate(ROW_TYPES)}
+ROW_TYPE_DTYPE = pd.CategoricalDtype(ROW_TYPES)
+
+
+def compact(df):
+    """`df` with the column types of the position table: int64 positions, categorical row types
+    (with the codes of `ROW_TYPES`) and nullable int16 depths that are missing for text rows."""
+    return df.astype({
+        "position": np.int64,
+        "row_type": ROW_TYPE_DTYPE,
+        "el": object,
+        "depth": "Int16",
+        "text": object,
+    })
+
+
 class Context(list):
     """list of etree.Elements that define the context of a position."""
     def __str__(self):
@@ -23,218 +45,457 @@ class Context(list):
         return True
 
 class PositionTable:
-    """Base representation that connects the tree and the standoff world."""
+    """Base representation that connects the tree and the standoff world.
+
+    The table is stored in the pandas.DataFrame `df` with the column types of `compact`. All
+    algorithms access the table through `_column`, `_row_types` and `_depths` and change it through
+    `_insert_rows`, `_set_value`, `_drop_rows` and `_merge`, so that other table engines only need
+    to replace these. `_column("row_type")` and iterating over the table give the row types as
+    strings, the algorithms compare the int8 codes of `_row_types` instead.
+
+    The text is kept once in `plain`. The text of a text row is the slice of `plain` from its
+    position up to the position of the next row (or the end of the text), so that splitting and
+    joining text rows only changes positions. The `text` column holds these slices as given by
+    `_text_value`.
+
+    The rows of every element are looked up in an index that maps the element to the indices
+    of its first and last row (open and close, or twice the empty row) and to its parent element.
+    The index is built on first use and kept up to date by all modifications of the table. The
+    parents of newly inserted elements are resolved when the next structural query needs them.
+    Elements are also indexed by their tag, see `get_rows_by_tag`.
+
+    `version` counts the modifications of the table, so that derived data (e.g. a View) can
+    tell whether it is still up to date.
+    """
     def __init__(self, df):
-        self.df = df
+        self.df = compact(df)
         self.plain = "".join(self.df[~self.df.text.isnull()].text)
+        self.el_ids_ = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self.df)
 
     def __iter__(self):
-        for irow, row in self.df.iterrows():
-            yield (
-                row.position,
-                row.row_type,
-                row.el,
-                row.depth,
-                row.text,
-            )
-    
+        yield from zip(*(self._column(column) for column in COLUMNS))
+
+    def __contains__(self, el):
+        if self.el_ids_ is None:
+            self.__build_el_index()
+        return el in self.el_ids_
+
+    # storage
+
+    def _column(self, name):
+        """array with the values of the column `name`."""
+        return self.df[name].values
+
+    def _row_types(self):
+        """int8 array with the codes (see `ROW_TYPES`) of the row types."""
+        return self.df.row_type.array.codes
+
+    def _depths(self, indices=slice(None)):
+        """int16 array with the depths of the rows `indices` (all rows by default), -1 for text rows."""
+        return self.df.depth.array[indices].to_numpy(dtype=np.int16, na_value=-1)
+
+    @staticmethod
+    def __frame(rows):
+        return compact(pd.DataFrame({
+            column: [row[icolumn] for row in rows]
+            for icolumn, column in enumerate(COLUMNS)
+        }))
+
+    def _insert_rows(self, index, rows):
+        """insert the (position, row_type, el, depth, text) tuples `rows` before the row `index`."""
+        self.df = pd.concat(
+            [self.df.iloc[:index], self.__frame(rows), self.df.iloc[index:]], ignore_index=True
+        )
+
+    def _text_value(self, begin, end):
+        """value of the `text` column for a text row that spans `plain[begin:end]`."""
+        return self.plain[begin:end]
+
+    def _set_value(self, index, column, value):
+        self.df.at[index, column] = value
+
+    def _drop_rows(self, indices):
+        self.df = self.df.drop(indices).reset_index(drop=True)
+
+    def _merge(self, order, rows):
+        """append the (position, row_type, el, depth, text) tuples `rows` and reorder all rows by `order`."""
+        self.df = pd.concat(
+            [self.df, self.__frame(rows)], ignore_index=True
+        ).iloc[order].reset_index(drop=True)
+
+    # element index
+
+    def __build_el_index(self):
+        self.el_ids_ = {}
+        self.el_list_ = []
+        self.el_parents_ = []
+        self.unresolved_ = []
+        self.tag_index_ = {}
+        el_rows = []
+        stack = [-1]
+        for irow, (row_type, el) in enumerate(zip(self._row_types().tolist(), self._column("el"))):
+            if el is None:
+                continue
+            if row_type == CLOSE:
+                el_rows[self.el_ids_[el]][1] = irow
+                stack.pop()
+                continue
+            el_id = len(el_rows)
+            self.el_ids_[el] = el_id
+            self.el_list_.append(el)
+            self.el_parents_.append(stack[-1])
+            self.tag_index_.setdefault(el.tag, []).append(el_id)
+            el_rows.append([irow, irow])
+            if row_type == OPEN:
+                stack.append(el_id)
+        self.el_rows_ = np.array(el_rows, dtype=np.int64).reshape(-1, 2)
+
+    def _rows_of(self, el):
+        """indices of all rows of `el`."""
+        if self.el_ids_ is None:
+            self.__build_el_index()
+        first, last = self.el_rows_[self.el_ids_[el]]
+        return [first] if first == last else [first, last]
+
+    def __index_new_rows(self, indices, rows):
+        """add the rows `rows` that now have the indices `indices` to the element index."""
+        el_rows = []
+        for irow, row in zip(indices, rows):
+            el = row[2]
+            if el is None:
+                continue
+            if el in self.el_ids_:
+                el_id = self.el_ids_[el]
+                if el_id >= len(self.el_rows_):
+                    el_rows[el_id - len(self.el_rows_)][1] = irow
+                else:
+                    self.el_rows_[el_id] = sorted([self.el_rows_[el_id][0], irow])
+            else:
+                el_id = len(self.el_rows_) + len(el_rows)
+                self.el_ids_[el] = el_id
+                self.el_list_.append(el)
+                self.el_parents_.append(-1)
+                self.unresolved_.append(el_id)
+                self.tag_index_.setdefault(el.tag, []).append(el_id)
+                el_rows.append([irow, irow])
+        if len(el_rows) > 0:
+            self.el_rows_ = np.concatenate([
+                self.el_rows_, np.array(el_rows, dtype=np.int64)
+            ])
+
+    def __enclosing_id(self, index):
+        """id of the innermost element that encloses the row `index`, -1 for the root."""
+        row_types = self._row_types()
+        irow = index - 1
+        while irow >= 0 and row_types[irow] == TEXT:
+            irow -= 1
+        if irow < 0:
+            return -1
+        el_id = self.el_ids_[self._column("el")[irow]]
+        return el_id if row_types[irow] == OPEN else self.el_parents_[el_id]
+
+    def __child_ids(self, el_id):
+        """ids of the elements directly enclosed by the element with id `el_id`."""
+        row_types = self._row_types()
+        els = self._column("el")
+        irow, last = self.el_rows_[el_id]
+        irow += 1
+        while irow < last:
+            if row_types[irow] == TEXT:
+                irow += 1
+                continue
+            child_id = self.el_ids_[els[irow]]
+            yield child_id
+            irow = self.el_rows_[child_id][1] + 1
+
+    def __resolve_parents(self):
+        """set the parents of the inserted elements and move the elements they enclose below them."""
+        if self.el_ids_ is None:
+            self.__build_el_index()
+        if len(self.unresolved_) == 0:
+            return
+        unresolved = sorted(
+            (el_id for el_id in self.unresolved_ if self.el_rows_[el_id][0] >= 0),
+            key=lambda el_id: self.el_rows_[el_id][0]
+        )
+        self.unresolved_ = []
+        for el_id in unresolved:
+            self.el_parents_[el_id] = self.__enclosing_id(self.el_rows_[el_id][0])
+            for child_id in self.__child_ids(el_id):
+                self.el_parents_[child_id] = el_id
+
+    def __insert(self, index, rows):
+        self._insert_rows(index, rows)
+        self.version += 1
+        if self.el_ids_ is not None:
+            self.el_rows_[self.el_rows_ >= index] += len(rows)
+            self.__index_new_rows(range(index, index + len(rows)), rows)
+
+    def __drop(self, indices):
+        indices = np.sort(np.asarray(indices, dtype=np.int64))
+        if self.el_ids_ is not None:
+            els = self._column("el")
+            for el in {els[index] for index in indices} & self.el_ids_.keys():
+                self.el_rows_[self.el_ids_.pop(el)] = -1
+        self._drop_rows(list(indices))
+        self.version += 1
+        if self.el_ids_ is not None:
+            valid = self.el_rows_ >= 0
+            self.el_rows_[valid] -= np.searchsorted(indices, self.el_rows_[valid])
+
+    def __merge(self, gaps, rows):
+        """insert each of the `rows` before the row with the corresponding index in `gaps`. Rows with the same gap keep their order."""
+        gaps = np.asarray(gaps, dtype=int)
+        n_rows = len(self)
+        order = np.lexsort((
+            np.concatenate([np.zeros(n_rows, dtype=int), np.arange(len(gaps))]),
+            np.concatenate([np.ones(n_rows, dtype=int), np.zeros(len(gaps), dtype=int)]),
+            np.concatenate([np.arange(n_rows), gaps]),
+        ))
+        self._merge(order, rows)
+        self.version += 1
+        if self.el_ids_ is not None:
+            new_indices = np.empty(len(order), dtype=np.int64)
+            new_indices[order] = np.arange(len(order))
+            valid = self.el_rows_ >= 0
+            self.el_rows_[valid] = new_indices[self.el_rows_[valid]]
+            self.__index_new_rows(new_indices[n_rows:], rows)
+
+    # queries
+
     def iter_positions(self, include_empty_els=True):
 
         current_context = Context()
-        for irow, row in self.df.iterrows():
-            if row.row_type == "open":
-                current_context.append(row.el)
-            if row.row_type == "close":
+        for position, row_type, el, depth, text in self:
+            if row_type == "open":
+                current_context.append(el)
+            if row_type == "close":
                 current_context = Context(current_context[:-1])
-            if row.row_type == "empty" and include_empty_els:
-                yield row.position, Context(current_context + [row.el]), None
-            if row.row_type == "text":
-                yield row.position, current_context, row.text
+            if row_type == "empty" and include_empty_els:
+                yield position, Context(current_context + [el]), None
+            if row_type == "text":
+                yield position, current_context, text
 
     def get_text(self):
         return self.plain
 
-    def set_el(self, el, map_):        
-        for k,v in map_.items():
-            assert k in ['el', 'position', 'row_type', 'depth', 'text']
-            indices = self.df.loc[self.df.el == el, k].index
-            for index in indices:
-                self.df.at[index, k] = v
-
-    def __split_string(self, pos):
-
-        slice_ = self.df[np.logical_and(
-            self.df.position < pos,
-            self.df.row_type == "text"
-        )]
-
-        old_row = slice_.iloc[-1]
-        base_position = old_row.position
-        split_index = pos - base_position
-
-        new_text1 = old_row.text[:split_index]
-        new_text2 = old_row.text[split_index:]
-
-        new_row1 = (base_position, "text", None, old_row.depth, new_text1)
-        new_row2 = (pos, "text", None, old_row.depth, new_text2)
-
-        index = old_row.name
-        self.df.loc[index] = new_row1
-        self.df.loc[index+.5] = new_row2
-        self.df = self.df.sort_index().reset_index(drop=True)
-
-    def insert_open(self, pos, el, new_depth):
-        row_type = "open"
-        if not (self.df.position==pos).any():
-            # pos not in self.df.position
-            self.__split_string(pos)
-        slice_ = self.df[self.df.position == pos]
-        after_pos = np.ravel(np.argwhere(~(slice_.depth<new_depth).values))[0]
-        index = slice_.iloc[after_pos].name-.5
-        self.df.loc[index] = (pos, row_type, el, new_depth, None)
-        self.df = self.df.sort_index().reset_index(drop=True)
-
-    def insert_close(self, pos, el, new_depth):
-        row_type = "close"
-        if not (self.df.position==pos).any():
-            # pos not in self.df.position
-            self.__split_string(pos)
-        slice_ = self.df[self.df.position == pos]
-        after_pos = np.ravel(np.argwhere(~(slice_.depth>new_depth).values))[0]
-        index = slice_.iloc[after_pos].name-.5
-        self.df.loc[index] = (pos, row_type, el, new_depth, None)
-        self.df = self.df.sort_index().reset_index(drop=True)
-
-    def insert_empty(self, pos, el, new_depth, insert_index_at_pos=0):
-
-
-        row_type = "empty"
-
-        if not (self.df.position==pos).any():
-            # pos not in self.df.position
-            self.__split_string(pos)
-
-        slice_ = self.df[self.df.position == pos]
-        
-        ind_candidates = []
-
-        for _,row in slice_.iterrows():
-            if row.row_type == 'close' and row.depth+1 == new_depth:
-                ind_candidates.append(row.name-.5)
-            elif row.row_type == 'open' and row.depth+1 == new_depth:
-                ind_candidates.append(row.name+.5)
-            elif row.row_type == 'empty' and row.depth == new_depth:
-                ind_candidates.append(row.name+.5)
-            elif row.row_type == 'text':
-                ind_candidates.append(row.name-.5)
-
-
-        ind_candidates = sorted(list(set(ind_candidates)))
-        # import pdb; pdb.set_trace()
-        index = ind_candidates[insert_index_at_pos]
-    
-        self.df.loc[index] = (pos, row_type, el, new_depth, None)
-        self.df = self.df.sort_index().reset_index(drop=True)
-
-    def remove_el(self, el):
-    
-        index = self.df[self.df.el == el].index
-        self.df.drop(index, inplace=True)
-    
-        for idx_entry in index:
-            
-            old_row1 = self.df.loc[idx_entry-1]
-            old_row2 = self.df.loc[idx_entry+1]
-
-            if (old_row1.row_type=='text'
-                and old_row2.row_type=='text'):
-                # join string rows
-                new_row = (
-                    old_row1.position,
-                    "text",
-                    None,
-                    old_row1.depth,
-                    old_row1.text + old_row2.text
-                )
-                self.df.drop(idx_entry+1, inplace=True)
-                self.df.loc[idx_entry-1] = new_row
-
-                self.df = self.df.reset_index(drop=True)
+    def get_span(self, el):
+        """(begin, end, depth) of the element `el`."""
+        indices = self._rows_of(el)
+        positions = self._column("position")
+        return (
+            positions[indices[0]],
+            positions[indices[-1]],
+            int(self._depths([indices[0]])[0]),
+        )
+
+    def get_el_slice(self, el):
+        """The rows from the open row of `el` up to its close row (exclusive) in a format that can be passed to `standoff2tree`."""
+        indices = self._rows_of(el)
+        return self.df.iloc[indices[0]:indices[-1]]
+
+    def __rows_at(self, pos):
+        positions = self._column("position")
+        return (
+            np.searchsorted(positions, pos, side="left"),
+            np.searchsorted(positions, pos, side="right")
+        )
+
+    def __has_rows_at(self, positions):
+        """boolean array that is True where a row exists at the corresponding position of the sorted `positions`."""
+        table_positions = self._column("position")
+        found = np.searchsorted(table_positions, positions, side="left")
+        exists = found < len(table_positions)
+        exists[exists] = table_positions[found[exists]] == positions[exists]
+        return exists
+
+    def __text_row_at(self, pos):
+        """index of the text row that contains the character at `pos`."""
+        lo, hi = self.__rows_at(pos)
+        row_types = self._row_types()
+
+        if lo == hi:
+            # pos not in position, the containing text row is (normally) the one right before
+            for irow in range(lo-1, -1, -1):
+                if row_types[irow] == TEXT:
+                    return irow
+            raise IndexError("no text row found")
+
+        return lo + np.ravel(np.argwhere(row_types[lo:hi] == TEXT))[0]
+
+    def get_parent(self, el):
+        """the element that directly encloses `el` according to the table."""
+        self.__resolve_parents()
+        parent_id = self.el_parents_[self.el_ids_[el]]
+        return self.el_list_[parent_id] if parent_id >= 0 else None
+
+    def get_descendants(self, el):
+        """All elements enclosed by `el` according to the table, in document order of their end."""
+        indices = self._rows_of(el)
+        row_types = self._row_types()
+        els = self._column("el")
+        return [
+            els[irow] for irow in range(indices[0] + 1, indices[-1])
+            if row_types[irow] in (CLOSE, EMPTY)
+        ]
+
+    def get_direct_children(self, el):
+        """The elements directly enclosed by `el` according to the table, in document order."""
+        self.__resolve_parents()
+        return [self.el_list_[child_id] for child_id in self.__child_ids(self.el_ids_[el])]
+
+    def get_previous_sibling(self, el):
+        """The element that directly precedes `el` within its parent according to the table, None if `el` is the first child."""
+        row_types = self._row_types()
+        irow = self._rows_of(el)[0] - 1
+        while irow >= 0 and row_types[irow] == TEXT:
+            irow -= 1
+        if irow < 0 or row_types[irow] == OPEN:
+            return None
+        return self._column("el")[irow]
+
+    def __joined_text(self, index):
+        """text of the consecutive text rows starting at the row `index`, None if it is empty."""
+        row_types = self._row_types()
+        end = index
+        while end < len(row_types) and row_types[end] == TEXT:
+            end += 1
+        if end == index:
+            return None
+        text = self.plain[self._column("position")[index]:self.__text_end(end - 1)]
+        return text if text != "" else None
+
+    def __text_end(self, index):
+        """end of the text of the text row `index` in `plain`."""
+        return self._column("position")[index + 1] if index + 1 < len(self) else len(self.plain)
+
+    def get_texts(self, el):
+        """(text, tail) of `el` in the etree according to the table."""
+        indices = self._rows_of(el)
+        text = self.__joined_text(indices[0] + 1) if len(indices) > 1 else None
+        return text, self.__joined_text(indices[-1] + 1)
+
+    def in_document_order(self, els):
+        """the elements `els` sorted by the position of their first row in the table."""
+        return sorted(els, key=lambda el: self._rows_of(el)[0])
+
+    def get_children(self, begin, end, depth):
+        """All elements that would be enclosed by an element spanning from `begin` to `end` at depth `depth`, in document order of their end."""
+        if begin == end:
+            return []
+
+        positions = self._column("position")
+        row_types = self._row_types()
+        els = self._column("el")
+
+        # skip the rows at `begin` that belong to the parents or to preceding elements
+        c_row_idx = self._open_index(begin, depth)
+
+        children = []
+        level = 0
+        while c_row_idx < len(positions):
+            c_row_pos = positions[c_row_idx]
+            if c_row_pos > end or (c_row_pos == end and level == 0):
+                break
 
-        self.df = self.df.reset_index(drop=True)
+            if row_types[c_row_idx] == OPEN:
+                level += 1
+            elif row_types[c_row_idx] == CLOSE:
+                if level == 0:
+                    break
+                level -= 1
+                children.append(els[c_row_idx])
+            elif row_types[c_row_idx] == EMPTY:
+                children.append(els[c_row_idx])
+            c_row_idx += 1
+
+        return children
+
+    def get_elements_in_range(self, begin, end, contained=False):
+        """(element, begin, end, depth) of all elements that overlap the character range from `begin` to `end`, in document order.
+        If `contained` is True, only elements that lie within the range are returned. Elements without text
+        are returned if they lie within the range."""
+        row_types = self._row_types()
+        els = self._column("el")
+
+        found = []
+        if not contained and begin < len(self.plain):
+            # elements that start before `begin` and enclose it
+            for el in self.get_context_at_pos(begin):
+                el_begin, el_end, el_depth = self.get_span(el)
+                if el_begin < begin:
+                    found.append((el, el_begin, el_end, el_depth))
+
+        lo, _ = self.__rows_at(begin)
+        _, hi = self.__rows_at(end)
+        for irow in range(lo, hi):
+            if row_types[irow] not in (OPEN, EMPTY):
+                continue
+            el = els[irow]
+            el_begin, el_end, el_depth = self.get_span(el)
+            if contained and el_end > end:
+                continue
+            if not contained and el_begin == end and el_end > el_begin:
+                continue
+            found.append((el, el_begin, el_end, el_depth))
+
+        return found
+
+    def get_rows(self, els):
+        """(first row, last row) of each of the elements `els` as an array of shape (n, 2)."""
+        if self.el_ids_ is None:
+            self.__build_el_index()
+        el_ids = np.array([self.el_ids_[el] for el in els], dtype=np.int64)
+        return self.el_rows_[el_ids].reshape(-1, 2)
+
+    def get_rows_by_tag(self, tag, attrib=None):
+        """(first row, last row) of all elements with the tag `tag` as an array of shape (n, 2), in document order.
+        The first and last row are the open and close row, or twice the empty row. If `attrib` is given, only
+        elements with all of these attribute values are returned, e.g. `{"type": "editorial"}`."""
+        if self.el_ids_ is None:
+            self.__build_el_index()
+        if tag not in self.tag_index_:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        el_ids = [el_id for el_id in self.tag_index_[tag] if self.el_rows_[el_id][0] >= 0]
+        self.tag_index_[tag] = el_ids
+        if attrib is not None:
+            el_ids = [
+                el_id for el_id in el_ids
+                if all(self.el_list_[el_id].get(k) == v for k, v in attrib.items())
+            ]
+        rows = self.el_rows_[np.array(el_ids, dtype=np.int64)]
+        return rows[np.argsort(rows[:, 0], kind="stable")]
 
     def get_context_at_pos(self, pos):
 
-        if not (self.df.position==pos).any():
-            # pos not in self.df.position
-            slice_ = self.df[np.logical_and(
-                self.df.position < pos,
-                self.df.row_type == "text"
-            )]
-
-            slice_ = slice_.iloc[-1]
-
-        else:
-            slice_ = self.df[np.logical_and(
-                self.df.position == pos,
-                self.df.row_type == "text"
-            )].iloc[0]
-        
-        index = slice_.name
-
-        cache = set()
-        for irow in range(index, -1, -1):
-            row = self.df.loc[irow]
-            if row.row_type == "close":
-                cache.add(row.el)
-            if row.row_type == "open" and row.el not in cache:
-                break
-        parent = row.el
+        index = self.__text_row_at(pos)
+        self.__resolve_parents()
 
-        context = [parent]
-        
-        if strip_ns(parent.tag) == 'text':
-            return Context(context)
-
-        while strip_ns(context[-1].getparent().tag) != "text":
-            context.append(context[-1].getparent())
-        context.append(context[-1].getparent())
+        context = []
+        el_id = self.__enclosing_id(index)
+        while el_id >= 0:
+            # no context is longer than the number of elements
+            if len(context) == len(self.el_list_):
+                raise ValueError(f"the parents of the elements at {pos} form a cycle.")
+            context.append(self.el_list_[el_id])
+            el_id = self.el_parents_[el_id]
 
         return Context(context[::-1])
 
-        # slice_ = self.df[np.logical_and(
-        #     self.df.position == pos,
-        #     self.df.row_type == "text"
-        # )].iloc[0]
-        
-        # parent = self.df[np.logical_or(
-        #     self.df.row_type=="open",
-        #     self.df.row_type=="close",
-        # )].loc[:slice_.name][::-1]
-        # cache = set()
-        # for irow, row in parent.iterrows():
-        #     if row.row_type == "close":
-        #         cache.add(row.el)
-        #     if row.row_type == "open" and row.el not in cache:
-        #         break
-        # parent = row.el
-
-        # context = [parent]
-        # while strip_ns(context[-1].getparent().tag) != "text":
-        #     context.append(context[-1].getparent())
-        # context.append(context[-1].getparent())
-
-        # return Context(context[::-1])
-            
     def collapse(self, include_empty_els=True):
 
         collapsed_table = []
 
         text_buffer = ""
         c_context = None
-        
+
         for pos, new_context, txt in self.iter_positions(include_empty_els):
-            
+
             # Deal with starting context
             if c_context is None and txt is not None:
                 # first text item
@@ -248,7 +509,7 @@ class PositionTable:
                 text_buffer = ""
 
                 c_context = sc(new_context)
-            
+
             # include empty elements
             el = new_context[-1]
             if is_empty_el(el):
@@ -265,12 +526,228 @@ class PositionTable:
                 })
 
             text_buffer += txt if txt is not None else ""
-        
+
         # include trailing text
         if text_buffer != "":
             collapsed_table.append({
                 "context": c_context,
                 "text": text_buffer
             })
-        
-        return pd.DataFrame(collapsed_table)
\ No newline at end of file
+
+        return pd.DataFrame(collapsed_table)
+
+    # modifications
+
+    def set_el(self, el, map_):
+        self.version += 1
+        for k,v in map_.items():
+            assert k in COLUMNS
+            indices = self._rows_of(el)
+            for index in indices:
+                self._set_value(index, k, v)
+            if k == "el":
+                el_id = self.el_ids_.pop(el)
+                self.el_ids_[v] = el_id
+                self.el_list_[el_id] = v
+                if v.tag != el.tag:
+                    self.tag_index_[el.tag].remove(el_id)
+                    self.tag_index_.setdefault(v.tag, []).append(el_id)
+                el = v
+
+    def shift_depth(self, els, delta):
+        """Change the depth of all rows of the elements in `els` by `delta`."""
+        self.version += 1
+        rows = [index for el in els for index in self._rows_of(el)]
+        if len(rows) == 0:
+            return
+        for index, depth in zip(rows, self._depths(rows).tolist()):
+            self._set_value(index, "depth", depth + delta)
+
+    def __split_string(self, pos):
+        self.split_at([pos])
+
+    def split_at(self, positions):
+        """Make sure that every position in `positions` is the position of at least one row.
+        All text rows that need to be split are split in a single pass."""
+
+        positions = np.unique(np.asarray(positions, dtype=int))
+        missing = positions[~self.__has_rows_at(positions)]
+        if len(missing) == 0:
+            return
+
+        splits = {}
+        for pos in missing:
+            splits.setdefault(self.__text_row_at(pos), []).append(pos)
+
+        gaps = []
+        new_rows = []
+        for index, split_positions in splits.items():
+            base_position = self._column("position")[index]
+            text_end = self.__text_end(index)
+            self._set_value(index, "text", self._text_value(base_position, split_positions[0]))
+            for start, stop in zip(split_positions, split_positions[1:] + [text_end]):
+                gaps.append(index + 1)
+                new_rows.append((start, "text", None, None, self._text_value(start, stop)))
+
+        self.__merge(gaps, new_rows)
+
+    def _open_index(self, pos, new_depth):
+        """index of the row before which an open row at `pos` with depth `new_depth` is inserted."""
+        lo, hi = self.__rows_at(pos)
+        # an element that starts at `pos` starts after all elements that end there
+        closes = np.ravel(np.argwhere(self._row_types()[lo:hi] == CLOSE))
+        if len(closes) > 0:
+            lo += closes[-1] + 1
+        # text rows (depth -1) do not belong to a parent
+        depths = self._depths(slice(lo, hi))
+        row_types = self._row_types()[lo:hi]
+        after_pos = np.ravel(np.argwhere((depths >= new_depth) | (row_types == TEXT)))
+        return lo + after_pos[0] if len(after_pos) > 0 else hi
+
+    def _close_index(self, pos, new_depth):
+        """index of the row before which a close row at `pos` with depth `new_depth` is inserted."""
+        lo, hi = self.__rows_at(pos)
+        depths = self._depths(slice(lo, hi))
+        after_pos = np.ravel(np.argwhere(depths <= new_depth))
+        return lo + after_pos[0] if len(after_pos) > 0 else hi
+
+    def _empty_index(self, pos, new_depth, insert_index_at_pos=0):
+        """index of the row before which an empty row at `pos` with depth `new_depth` is inserted."""
+        lo, hi = self.__rows_at(pos)
+        row_types = self._row_types()
+        els = self._column("el")
+        depths = self._depths(slice(lo, hi))
+
+        ind_candidates = []
+        for irow in range(lo, hi):
+            if isinstance(els[irow], etree._Comment):
+                # nothing can be put inside of a comment
+                continue
+            if row_types[irow] == CLOSE and depths[irow - lo]+1 == new_depth:
+                ind_candidates.append(irow)
+            elif row_types[irow] == OPEN and depths[irow - lo]+1 == new_depth:
+                ind_candidates.append(irow+1)
+            elif row_types[irow] == EMPTY and depths[irow - lo] == new_depth:
+                ind_candidates.append(irow+1)
+            elif row_types[irow] == TEXT:
+                ind_candidates.append(irow)
+
+        ind_candidates = sorted(list(set(ind_candidates)))
+        return ind_candidates[insert_index_at_pos]
+
+    def insert_open(self, pos, el, new_depth):
+        self.__split_string(pos)
+        index = self._open_index(pos, new_depth)
+        self.__insert(index, [(pos, "open", el, new_depth, None)])
+
+    def insert_close(self, pos, el, new_depth):
+        self.__split_string(pos)
+        index = self._close_index(pos, new_depth)
+        self.__insert(index, [(pos, "close", el, new_depth, None)])
+
+    def insert_empty(self, pos, el, new_depth, insert_index_at_pos=0):
+        self.__split_string(pos)
+        index = self._empty_index(pos, new_depth, insert_index_at_pos)
+        self.__insert(index, [(pos, "empty", el, new_depth, None)])
+
+    def empty_depths(self, pos, text_depth=None):
+        """the depths at which an empty element can be inserted at `pos` (see `_empty_index`). `text_depth` is
+        the depth of the text at `pos`, by default the length of its context."""
+        if text_depth is None:
+            text_depth = len(self.get_context_at_pos(pos))
+        lo, hi = self.__rows_at(pos)
+        if lo == hi:
+            # the text at `pos` is split when the element is inserted
+            return {text_depth}
+        row_types = self._row_types()
+        els = self._column("el")
+        depths = self._depths(slice(lo, hi))
+
+        levels = set()
+        for irow in range(lo, hi):
+            if isinstance(els[irow], etree._Comment):
+                # nothing can be put inside of a comment
+                continue
+            if row_types[irow] in (CLOSE, OPEN):
+                levels.add(int(depths[irow - lo]) + 1)
+            elif row_types[irow] == EMPTY:
+                levels.add(int(depths[irow - lo]))
+            elif row_types[irow] == TEXT:
+                levels.add(text_depth)
+        return levels
+
+    def insert_index(self, pos, row_type, new_depth):
+        """index of the row before which a new row would be inserted. `pos` has to be the position of a row already."""
+        if row_type == "open":
+            return self._open_index(pos, new_depth)
+        elif row_type == "close":
+            return self._close_index(pos, new_depth)
+        elif row_type == "empty":
+            return self._empty_index(pos, new_depth)
+        else:
+            raise ValueError("Row type unkown.")
+
+    def insert_many(self, rows, gaps=None):
+        """Insert many open, close and empty rows with a single merge of the table.
+
+        arguments:
+        rows (list)-- list of (position, row_type, el, depth) tuples. Rows that end up
+            between the same two rows of the table are ordered such that they nest properly.
+        gaps (list)-- indices as returned by `insert_index` for the rows, if they have been
+            computed already (after `split_at` the positions of the rows).
+        """
+        rows = list(rows)
+        if len(rows) == 0:
+            return
+
+        if gaps is None:
+            self.split_at([position for position, _, _, _ in rows])
+            gaps = [
+                self.insert_index(position, row_type, depth)
+                for position, row_type, _, depth in rows
+            ]
+
+        max_close_depth = {}
+        for gap, (_, row_type, _, depth) in zip(gaps, rows):
+            if row_type == "close":
+                max_close_depth[gap] = max(depth, max_close_depth.get(gap, depth))
+
+        # closes (deepest first), then opens (shallowest first). Empty elements go
+        # where the nesting level matches their depth.
+        keys = []
+        for gap, (_, row_type, _, depth) in zip(gaps, rows):
+            if row_type == "close":
+                keys.append((0, -depth))
+            elif row_type == "open":
+                keys.append((2, depth))
+            elif gap in max_close_depth and depth <= max_close_depth[gap] + 1:
+                keys.append((0, -depth + .5))
+            else:
+                keys.append((2, depth - .5))
+
+        order = sorted(range(len(rows)), key=lambda i: (gaps[i], rows[i][0], keys[i], i))
+        self.__merge(
+            [gaps[i] for i in order],
+            [rows[i] + (None,) for i in order]
+        )
+
+    def remove_el(self, el):
+
+        self.__resolve_parents()
+        el_id = self.el_ids_[el]
+        for child_id in list(self.__child_ids(el_id)):
+            self.el_parents_[child_id] = self.el_parents_[el_id]
+
+        for index in sorted(self._rows_of(el), reverse=True):
+            self.__drop([index])
+
+            row_types = self._row_types()
+            if (0 < index < len(self)
+                and row_types[index-1] == TEXT
+                and row_types[index] == TEXT):
+                # join string rows
+                self.__drop([index])
+                self._set_value(
+                    index-1, "text",
+                    self._text_value(self._column("position")[index-1], self.__text_end(index-1))
+                )
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+from .base import PositionTable, ROW_TYPE_DTYPE, TEXT
+
+# changes whenever the layout of the cache files changes
+CACHE_FORMAT = 1
+
+# the arrays of `position_table2arrays`
+ARRAY_NAMES = ("position", "row_type", "depth", "el", "n_els", "plain")
+
+
+def position_table2arrays(table, text_el):
+    """The columns of the position table `table` of `text_el` as NumPy arrays. Elements are described by
+    their index in `text_el.iter()` (document order), text rows by -1, the text is stored as UTF-8."""
+    el_indices = {el: iel for iel, el in enumerate(text_el.iter())}
+    return {
+        "position": np.asarray(table._column("position"), dtype=np.int64),
+        "row_type": np.asarray(table._row_types(), dtype=np.int8),
+        "depth": np.asarray(table._depths(), dtype=np.int16),
+        "el": np.array([
+            -1 if el is None else el_indices[el] for el in table._column("el")
+        ], dtype=np.int32),
+        "n_els": np.array([len(el_indices)], dtype=np.int64),
+        "plain": np.frombuffer(table.get_text().encode("utf-8"), dtype=np.uint8),
+    }
+
+
+def arrays2position_table(arrays, text_el, table_class):
+    """Rebuild the position table of `text_el` from the arrays of `position_table2arrays`. Returns None
+    if the elements of `text_el` do not match the arrays."""
+    els = list(text_el.iter())
+    if len(els) != arrays["n_els"][0]:
+        return None
+
+    plain = arrays["plain"].tobytes().decode("utf-8")
+    row_types = arrays["row_type"]
+    positions = arrays["position"].tolist()
+    text_ends = positions[1:] + [len(plain)]
+    texts = np.full(len(positions), None, dtype=object)
+    texts[row_types == TEXT] = [
+        plain[positions[irow]:text_ends[irow]] for irow in np.flatnonzero(row_types == TEXT).tolist()
+    ]
+
+    els.append(None)
+    row_els = np.fromiter((els[iel] for iel in arrays["el"].tolist()), dtype=object, count=len(positions))
+
+    return table_class(pd.DataFrame({
+        "position": arrays["position"],
+        "row_type": pd.Categorical.from_codes(row_types, dtype=ROW_TYPE_DTYPE),
+        "el": row_els,
+        "depth": pd.arrays.IntegerArray(arrays["depth"], row_types == TEXT),
+        "text": texts,
+    }))
+
+
+def parse_cached(content, arrays, text_tag, header_tag, header="keep", table_class=PositionTable):
+    """Parse the XML `content` (bytes) and take the position table of the element with the tag `text_tag`
+    from the `arrays` of `position_table2arrays`. The arguments and the result are those of
+    `iterparse2position_table`, the result is None if the arrays do not match the content."""
+    root = etree.fromstring(content)
+    texts = list(root.iter(text_tag))
+    if len(texts) == 0:
+        raise ValueError("No text attribute found.")
+    elif len(texts) > 1:
+        raise ValueError("More than one text element is not supported.")
+    text_el = texts[0]
+
+    table = arrays2position_table(arrays, text_el, table_class)
+    if table is None:
+        return None
+
+    header_el = None
+    header_bytes = None
+    if header != "keep":
+        for el in root.iter(header_tag):
+            if any(ancestor is text_el for ancestor in el.iterancestors()):
+                continue
+            if header == "lazy":
+                header_bytes = etree.tostring(el, with_tail=False)
+            el.clear(keep_tail=True)
+            header_el = el
+
+    text_el.tail = None # remove trailing whitespace of text element
+
+    return root, text_el, table, header_el, header_bytes
+
+
+class TableCache:
+    """Directory with the position tables of parsed XML files, so that a file only has to be converted once.
+
+    The tables are stored with `numpy.savez` under the SHA-256 hash of the file content and the tag of the text element.
+    When a table is loaded, the XML is parsed again (without the conversion) and the elements of the table are
+    taken from the parsed tree. If the files in the directory take up more than `max_bytes`, the least recently
+    used ones are removed.
+    """
+    def __init__(self, directory, max_bytes=2**30):
+        """
+        arguments:
+            directory (str): directory of the cache, it is created if it does not exist.
+            max_bytes (int): maximal size of all cached tables together.
+        """
+        if max_bytes <= 0:
+            raise ValueError("max_bytes has to be positive.")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(content, text_tag):
+        """hash of the XML `content` (bytes) and the tag `text_tag` of the text element, e.g. "{http://www.tei-c.org/ns/1.0}text"."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([CACHE_FORMAT, text_tag]).encode("utf-8"))
+        digest.update(content)
+        return digest.hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self.__path(key))
+
+    def load(self, key):
+        """the arrays stored under `key`, None if there are none or if the file is incomplete."""
+        path = self.__path(key)
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                arrays = {name: stored[name] for name in ARRAY_NAMES}
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+        # the modification time marks the last use
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return arrays
+
+    def store(self, key, arrays):
+        """store the `arrays` under `key` and remove the least recently used tables if the cache is too large."""
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.__path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """remove the least recently used tables until all tables fit into `max_bytes`. The table `keep` is removed last."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((name[:-len(".npz")] == keep, stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, _, size, _ in entries)
+        for _, _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """remove all tables."""
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+from .base import PositionTable, COLUMNS, ROW_TYPES, ROW_TYPE_CODES, ROW_TYPE_DTYPE, TEXT, compact
+
+ROW_TYPE_NAMES = np.array(ROW_TYPES, dtype=object)
+
+
+class ColumnarPositionTable(PositionTable):
+    """Position table that keeps its columns in parallel arrays instead of a pandas.DataFrame.
+
+    `position` (int64), `row_type` (int8 codes, see `ROW_TYPES`) and `depth` (int16, -1 for text
+    rows) are NumPy arrays, `el` is a list. There is no text column: the texts of the text rows
+    are sliced from `plain` when they are requested, so that splitting and joining text rows only
+    changes positions. The DataFrame `df` is only built (and cached) when it is accessed and must
+    be treated as read-only.
+    """
+    def __init__(self, df):
+        df = compact(df)
+        self.columns = {
+            "position": df.position.values,
+            "row_type": df.row_type.array.codes.copy(),
+            "el": list(df.el),
+            "depth": df.depth.array.to_numpy(dtype=np.int16, na_value=-1),
+        }
+        self.plain = "".join(text for text in df.text if text is not None)
+        self.df_ = None
+        self.el_ids_ = None
+        self.version = 0
+
+    @property
+    def df(self):
+        """DataFrame view of the table with the same layout as `PositionTable.df`."""
+        if self.df_ is None:
+            self.df_ = pd.DataFrame({
+                "position": self.columns["position"],
+                "row_type": pd.Categorical.from_codes(self.columns["row_type"], dtype=ROW_TYPE_DTYPE),
+                "el": pd.Series(self.columns["el"], dtype=object),
+                "depth": pd.arrays.IntegerArray(self.columns["depth"], self.columns["depth"] < 0),
+                "text": pd.Series(self.__texts(0, len(self)), dtype=object),
+            })
+        return self.df_
+
+    def __len__(self):
+        return len(self.columns["position"])
+
+    def _column(self, name):
+        if name == "row_type":
+            return ROW_TYPE_NAMES[self.columns["row_type"]]
+        if name == "depth":
+            return pd.arrays.IntegerArray(self.columns["depth"], self.columns["depth"] < 0)
+        if name == "text":
+            return self.__texts(0, len(self))
+        return self.columns[name]
+
+    def __texts(self, begin, end):
+        """the texts of the rows from `begin` to `end` (exclusive), None for element rows."""
+        positions = self.columns["position"]
+        text_ends = positions[begin + 1:end + 1]
+        if len(text_ends) < end - begin:
+            text_ends = np.append(text_ends, len(self.plain))
+        texts = [None] * (end - begin)
+        for irow in np.flatnonzero(self.columns["row_type"][begin:end] == TEXT).tolist():
+            texts[irow] = self.plain[positions[begin + irow]:text_ends[irow]]
+        return texts
+
+    def _text_value(self, begin, end):
+        return None
+
+    def _row_types(self):
+        return self.columns["row_type"]
+
+    def _depths(self, indices=slice(None)):
+        return self.columns["depth"][indices]
+
+    @staticmethod
+    def __typed(column, values):
+        """`values` converted to the type of the NumPy column `column`."""
+        if column == "row_type":
+            return [ROW_TYPE_CODES[value] for value in values]
+        if column == "depth":
+            return [-1 if value is None else value for value in values]
+        return values
+
+    def _insert_rows(self, index, rows):
+        for column in self.columns:
+            values = [row[COLUMNS.index(column)] for row in rows]
+            if column == "el":
+                self.columns[column][index:index] = values
+            else:
+                self.columns[column] = np.insert(
+                    self.columns[column], index, self.__typed(column, values)
+                )
+        self.df_ = None
+
+    def _set_value(self, index, column, value):
+        if column != "text":
+            self.columns[column][index] = self.__typed(column, [value])[0]
+        self.df_ = None
+
+    def _drop_rows(self, indices):
+        indices = sorted(indices)
+        for column in self.columns:
+            if column == "el":
+                for index in reversed(indices):
+                    del self.columns[column][index]
+            else:
+                self.columns[column] = np.delete(self.columns[column], indices)
+        self.df_ = None
+
+    def _merge(self, order, rows):
+        for column in self.columns:
+            new_values = [row[COLUMNS.index(column)] for row in rows]
+            if column == "el":
+                combined = self.columns[column] + new_values
+                self.columns[column] = [combined[i] for i in order]
+            else:
+                new_values = np.array(
+                    self.__typed(column, new_values),
+                    dtype=self.columns[column].dtype
+                )
+                self.columns[column] = np.concatenate(
+                    [self.columns[column], new_values]
+                )[order]
+        self.df_ = None
+
+    def get_el_slice(self, el):
+        indices = self._rows_of(el)
+        return {
+            "row_type": ROW_TYPE_NAMES[self.columns["row_type"][indices[0]:indices[-1]]],
+            "el": self.columns["el"][indices[0]:indices[-1]],
+            "text": self.__texts(indices[0], indices[-1]),
+        }
@@ -1,10 +1,11 @@
 import sys
+import numpy as np
 import pandas as pd
 from copy import deepcopy as dc
 from lxml import etree
 
 from .utils import is_empty_el, strip_ns, create_el_from_so
-from .base import PositionTable, Context
+from .base import PositionTable, Context, ROW_TYPE_DTYPE, OPEN, CLOSE, EMPTY, TEXT
 
 
 
@@ -33,7 +34,7 @@ def flatten_tree(tree):
     return flat_tree
 
 
-def flat_tree2position_table(flat_tree):
+def flat_tree2position_table(flat_tree, table_class=PositionTable):
     """Convert a flattened tree into a data frame that connects character positions of 
     the text with the elements surrounding it."""
     c_position = 0
@@ -58,7 +59,177 @@ def flat_tree2position_table(flat_tree):
             })
             c_position += len(text)
 
-    return PositionTable(pd.DataFrame(position_table))
+    return table_class(pd.DataFrame(position_table))
+
+
+class ColumnBuilder:
+    """Collects the rows of a position table in typed columns: int64 positions, int8 row type codes
+    (see `ROW_TYPES`), int16 depths (-1 for text rows) and object columns for elements and texts."""
+    def __init__(self):
+        self.position = 0
+        self.positions = []
+        self.row_types = []
+        self.els = []
+        self.depths = []
+        self.texts = []
+
+    def add(self, row_type, el, depth):
+        self.positions.append(self.position)
+        self.row_types.append(row_type)
+        self.els.append(el)
+        self.depths.append(depth)
+        self.texts.append(None)
+
+    def add_text(self, text):
+        if text is not None:
+            self.add(TEXT, None, -1)
+            self.texts[-1] = text
+            self.position += len(text)
+
+    def columns(self):
+        """the typed columns as (positions, row_types, els, depths, texts)."""
+        return (
+            np.array(self.positions, dtype=np.int64),
+            np.array(self.row_types, dtype=np.int8),
+            self.els,
+            np.array(self.depths, dtype=np.int16),
+            self.texts,
+        )
+
+    def to_table(self, table_class=PositionTable):
+        positions, row_types, els, depths, texts = self.columns()
+        return table_class(pd.DataFrame({
+            "position": positions,
+            "row_type": pd.Categorical.from_codes(row_types, dtype=ROW_TYPE_DTYPE),
+            "el": pd.Series(els, dtype=object),
+            "depth": pd.arrays.IntegerArray(depths, row_types == TEXT),
+            "text": pd.Series(texts, dtype=object),
+        }))
+
+
+def tree2position_table(tree, table_class=PositionTable):
+    """Convert an etree into a position table in a single iterative pass (with `etree.iterwalk`), so that
+    the depth of the tree is not limited by the recursion limit. Gives the same table as
+    `flat_tree2position_table(flatten_tree(tree))`."""
+    columns = ColumnBuilder()
+    depth = 0
+    is_empty = []
+    for event, el in etree.iterwalk(tree, events=("start", "end", "comment", "pi")):
+        if event == "end":
+            if not is_empty.pop():
+                depth -= 1
+                columns.add(CLOSE, el, depth)
+            columns.add_text(el.tail)
+            continue
+
+        # comments and processing instructions have no end event
+        complete = event != "start"
+        empty = is_empty_el(el)
+        if empty:
+            columns.add(EMPTY, el, depth)
+        else:
+            columns.add(OPEN, el, depth)
+            columns.add_text(el.text)
+            if complete:
+                columns.add(CLOSE, el, depth)
+            else:
+                depth += 1
+
+        if complete:
+            columns.add_text(el.tail)
+        else:
+            is_empty.append(empty)
+
+    return columns.to_table(table_class)
+
+
+def iterparse2position_table(source, text_tag, header_tag, header="keep", table_class=PositionTable):
+    """Parse the XML file `source` with `etree.iterparse` and fill the position table of the element
+    with the tag `text_tag` while parsing, without building a flattened tree first.
+
+    The text of an element is only complete when the parser reaches its first child or its end, and
+    the tail of an element when the parser reaches the next element. Therefore, rows are added one
+    event late.
+
+    arguments:
+        source (str or file)-- path or file object of the XML file.
+        text_tag (str)-- tag of the text element, for example "{http://www.tei-c.org/ns/1.0}text".
+        header_tag (str)-- tag of the header element.
+        header (str)-- "keep" the header in the tree, "lazy" to replace it by an empty element and return it serialized, or "skip" it.
+
+    returns:
+        (tree, text_el, table, header_el, header_bytes)
+    """
+    columns = ColumnBuilder()
+    depth = 0
+
+    texts = []
+    inside = False
+    pending = None # (kind, el) of the row whose text or tail is not complete yet
+    header_el = None
+    header_bytes = None
+
+    context = etree.iterparse(source, events=("start", "end", "comment", "pi"))
+    for event, el in context:
+        if event == "start" and el.tag == text_tag:
+            texts.append(el)
+
+        if not inside:
+            if event == "start" and len(texts) == 1 and el is texts[0]:
+                inside = True
+                pending = ("start", el)
+            elif event == "end" and el.tag == header_tag and header != "keep":
+                if header == "lazy":
+                    header_bytes = etree.tostring(el, with_tail=False)
+                el.clear(keep_tail=True)
+                header_el = el
+            continue
+
+        if pending is not None:
+            kind, pending_el = pending
+            pending = None
+            if kind == "start":
+                if event == "end" and el is pending_el and is_empty_el(el):
+                    columns.add(EMPTY, el, depth)
+                    if el is texts[0]:
+                        inside = False
+                    else:
+                        pending = ("tail", el)
+                    continue
+                columns.add(OPEN, pending_el, depth)
+                depth += 1
+                columns.add_text(pending_el.text)
+            else:
+                columns.add_text(pending_el.tail)
+
+        if event == "start":
+            pending = ("start", el)
+        elif event == "end":
+            depth -= 1
+            columns.add(CLOSE, el, depth)
+            if el is texts[0]:
+                inside = False
+            else:
+                pending = ("tail", el)
+        else:
+            # comments and processing instructions arrive complete
+            if is_empty_el(el):
+                columns.add(EMPTY, el, depth)
+            else:
+                columns.add(OPEN, el, depth)
+                columns.add_text(el.text)
+                columns.add(CLOSE, el, depth)
+            pending = ("tail", el)
+
+    if len(texts) == 0:
+        raise ValueError("No text attribute found.")
+    elif len(texts) > 1:
+        raise ValueError("More than one text element is not supported.")
+
+    text_el = texts[0]
+    text_el.tail = None # remove trailing whitespace of text element
+
+    return context.root, text_el, columns.to_table(table_class), header_el, header_bytes
 
 
 def append_text_to_el(el, text_tail, buf):
@@ -69,8 +240,10 @@ def append_text_to_el(el, text_tail, buf):
         el.tail = buf if el.tail is None else el.tail + buf
 
 # @profile
-def standoff2tree(table):
-    """Convert a position table to an etree."""
+def standoff2tree(table, reuse_els=False):
+    """Convert a position table to an etree. `table` can be a DataFrame or a dict of columns.
+    If `reuse_els` is True, the elements of the table are rebuilt in place instead of being copied,
+    their children, text and tail are reset (except for the tail of the root)."""
     curr_context = Context()
     curr_el = None
     prev_el = None
@@ -78,13 +251,14 @@ def standoff2tree(table):
     text_tail = None
     root = None
 
-    texts = table['text'].array
-    els = table['el'].array
+    texts = list(table['text'])
+    els = list(table['el'])
+    row_types = np.asarray(table['row_type'])
 
-    open_types = (table['row_type'].array == 'open')
-    close_types = (table['row_type'].array == 'close')
-    empty_types = (table['row_type'].array == 'empty')
-    text_types = (table['row_type'].array == 'text')
+    open_types = (row_types == 'open')
+    close_types = (row_types == 'close')
+    empty_types = (row_types == 'empty')
+    text_types = (row_types == 'text')
 
     text_buffer_start = None
 
@@ -101,7 +275,14 @@ def standoff2tree(table):
         if row_el is not None:
             if row_el not in old2new:
                 prev_el = curr_el
-                if isinstance(row_el, etree._Comment):
+                if reuse_els:
+                    curr_el = row_el
+                    if root is not None:
+                        curr_el.tail = None
+                    curr_el.text = None
+                    if not isinstance(curr_el, etree._Comment):
+                        del curr_el[:]
+                elif isinstance(row_el, etree._Comment):
                     curr_el = etree.Comment()
                 else:
                     curr_el = create_el_from_so(dc(row_el.tag), dc(row_el.attrib))
@@ -0,0 +1,230 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+def union_intervals(intervals):
+    """merge the [begin, end) intervals (array of shape (n, 2)) into sorted, disjoint intervals."""
+    intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+    intervals = intervals[intervals[:, 0] < intervals[:, 1]]
+    if len(intervals) == 0:
+        return intervals
+    intervals = intervals[np.argsort(intervals[:, 0], kind="stable")]
+
+    # an interval starts a new group if it begins after all previous intervals ended
+    reach = np.maximum.accumulate(intervals[:, 1])
+    new_group = np.concatenate([[True], intervals[1:, 0] > reach[:-1]])
+    group_ends = np.append(np.flatnonzero(new_group)[1:], len(intervals)) - 1
+    return np.stack([intervals[new_group, 0], reach[group_ends]], axis=1)
+
+
+def complement_intervals(intervals, begin, end):
+    """the parts of [begin, end) that are not covered by the intervals."""
+    intervals = union_intervals(intervals)
+    bounds = np.concatenate([[begin], intervals.ravel(), [end]]).reshape(-1, 2)
+    bounds = np.stack([np.maximum(bounds[:, 0], begin), np.minimum(bounds[:, 1], end)], axis=1)
+    return bounds[bounds[:, 0] < bounds[:, 1]]
+
+
+def covered_by(points, intervals):
+    """boolean mask of the `points` that lie within the sorted, disjoint `intervals`."""
+    points = np.asarray(points, dtype=np.int64)
+    if len(intervals) == 0:
+        return np.zeros(len(points), dtype=bool)
+    iinterval = np.searchsorted(intervals[:, 0], points, side="right") - 1
+    return (iinterval >= 0) & (points < intervals[np.maximum(iinterval, 0), 1])
+
+
+def _subtract_pieces(intervals, to_remove):
+    """the parts of the sorted, disjoint `intervals` that are not covered by `to_remove`,
+    split at every boundary of `intervals`."""
+    to_remove = union_intervals(to_remove)
+    points = np.unique(np.concatenate([intervals.ravel(), to_remove.ravel()]))
+    pieces = np.stack([points[:-1], points[1:]], axis=1)
+    keep = covered_by(pieces[:, 0], intervals) & ~covered_by(pieces[:, 0], to_remove)
+    return pieces[keep]
+
+
+def subtract_intervals(intervals, to_remove):
+    """the parts of the sorted, disjoint `intervals` that are not covered by `to_remove`."""
+    intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+    return union_intervals(_subtract_pieces(intervals, to_remove))
+
+
+class RunStore:
+    """View backend that keeps one run per row of the position table instead of one row per character.
+
+    Text rows are runs of characters that are sliced from the plain text of the table. Changes are stored as
+    intervals of cleared character positions and sparse overlays for single characters and for
+    the (zero-length) rows of elements, so that memory grows with the number of rows and changes,
+    not with the number of characters.
+    """
+    def __init__(self, table, plain):
+        self.plain = plain
+        self.__read_table(table)
+        self.cleared = np.zeros((0, 2), dtype=np.int64)
+        self.char_overlay = {}
+        self.slot_overlay = {}
+        self.version = 0
+        self.segments_ = (-1, None)
+
+    def __read_table(self, table):
+        self.positions = table.position.values.astype(np.int64)
+        self.row_types = table.row_type.values
+        self.els = table.el.values
+        self.is_text = np.asarray(self.row_types == "text")
+        self.text_end = len(self.plain)
+        self.row_lengths = np.where(self.is_text, np.diff(self.positions, append=self.text_end), 0)
+
+    def fork(self):
+        """a copy that shares the arrays of the table and has its own changes."""
+        forked = copy.copy(self)
+        forked.char_overlay = dict(self.char_overlay)
+        forked.slot_overlay = dict(self.slot_overlay)
+        return forked
+
+    def update(self, table):
+        """switch to a new version of the position table with the same text but other element rows. The changes of the text are kept and the texts set for element rows are moved to the new rows of the same elements."""
+        slot_texts = {
+            (self.els[irow], self.row_types[irow]): text
+            for irow, text in self.slot_overlay.items()
+        }
+        self.__read_table(table)
+        self.slot_overlay = {}
+        if len(slot_texts) > 0:
+            for irow, key in enumerate(zip(self.els, self.row_types)):
+                if key in slot_texts:
+                    self.slot_overlay[irow] = slot_texts[key]
+        self.version += 1
+
+    def __position_ranges(self, ranges):
+        """character positions of the text rows within the row ranges."""
+        ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+        ends = np.full(len(ranges), self.text_end, dtype=np.int64)
+        inside = ranges[:, 1] < len(self.positions)
+        ends[inside] = self.positions[ranges[inside, 1]]
+        return np.stack([self.positions[np.minimum(ranges[:, 0], len(self.positions) - 1)], ends], axis=1)
+
+    @staticmethod
+    def __drop_keys(overlay, ranges):
+        if len(overlay) == 0:
+            return
+        keys = np.array(list(overlay), dtype=np.int64)
+        for key in keys[covered_by(keys, union_intervals(ranges))].tolist():
+            del overlay[key]
+
+    def clear(self, ranges, slots=True):
+        """set all characters of the rows in the [begin, end) row ranges to "". If `slots` is False, only text rows are changed."""
+        position_ranges = self.__position_ranges(ranges)
+        self.cleared = union_intervals(np.concatenate([self.cleared, position_ranges]))
+        self.__drop_keys(self.char_overlay, position_ranges)
+        if slots:
+            self.__drop_keys(self.slot_overlay, ranges)
+        self.version += 1
+
+    def reset_text(self, ranges):
+        """set all characters of the text rows in the [begin, end) row ranges back to their original value."""
+        position_ranges = self.__position_ranges(ranges)
+        self.cleared = subtract_intervals(self.cleared, position_ranges)
+        self.__drop_keys(self.char_overlay, position_ranges)
+        self.version += 1
+
+    def set_rows(self, rows, texts):
+        """set the character of the element rows `rows` to `texts` (one str for all rows or one per row)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if isinstance(texts, str):
+            texts = [texts] * len(rows)
+        is_slot = ~self.is_text[rows]
+        self.slot_overlay.update(
+            (irow, text) for irow, text, keep in zip(rows.tolist(), texts, is_slot) if keep
+        )
+        self.version += 1
+
+    def replace(self, plain_indices, values):
+        """replace the characters that produced the characters at `plain_indices` of the plain text by `values`."""
+        starts, texts, table_indices, table_positions, widths, steps = self.segments()
+        plain_indices = np.asarray(plain_indices, dtype=np.int64)
+        values = list(values)
+        isegs = np.searchsorted(starts, plain_indices, side="right") - 1
+        is_slot = np.logical_and(steps[isegs] == 0, ~self.is_text[table_indices[isegs]])
+        positions = table_positions[isegs] + steps[isegs] * ((plain_indices - starts[isegs]) // widths[isegs])
+
+        for is_slot_value, key, value in zip(is_slot, np.where(is_slot, table_indices[isegs], positions).tolist(), values):
+            if is_slot_value:
+                self.slot_overlay[key] = value
+            else:
+                self.char_overlay[key] = value
+        self.version += 1
+
+    def segments(self):
+        """(starts, texts, table_indices, table_positions, widths, steps) of the pieces of the plain text.
+        A piece starts at `starts` within the plain text and consists of characters with `widths` characters
+        each, the table position grows by `steps` for each of them."""
+        if self.segments_[0] != self.version:
+            self.segments_ = (self.version, self.__build_segments())
+        return self.segments_[1]
+
+    def __build_segments(self):
+        text_rows = np.flatnonzero(self.row_lengths > 0)
+        text_intervals = np.stack([self.positions[text_rows], self.positions[text_rows] + self.row_lengths[text_rows]], axis=1)
+
+        overlay_positions = np.array(list(self.char_overlay), dtype=np.int64)
+        overlay_texts = list(self.char_overlay.values())
+
+        # characters that are taken from the table, split at the borders of the rows
+        pieces = _subtract_pieces(
+            text_intervals,
+            np.concatenate([self.cleared, np.stack([overlay_positions, overlay_positions + 1], axis=1)])
+        )
+        piece_rows = text_rows[np.searchsorted(text_intervals[:, 0], pieces[:, 0], side="right") - 1]
+        piece_texts = [self.plain[begin:end] for begin, end in pieces.tolist()]
+
+        # changed characters and texts of element rows
+        overlay_rows = text_rows[np.searchsorted(text_intervals[:, 0], overlay_positions, side="right") - 1]
+        slot_rows = np.array(list(self.slot_overlay), dtype=np.int64)
+        slot_texts = list(self.slot_overlay.values())
+
+        texts = np.array(piece_texts + overlay_texts + slot_texts + [""], dtype=object)[:-1]
+        table_indices = np.concatenate([piece_rows, overlay_rows, slot_rows])
+        table_positions = np.concatenate([pieces[:, 0], overlay_positions, self.positions[slot_rows]])
+        lengths = np.array([len(text) for text in texts], dtype=np.int64)
+        widths = np.concatenate([np.ones(len(pieces), dtype=np.int64), lengths[len(pieces):]])
+        steps = np.concatenate([np.ones(len(pieces), dtype=np.int64), np.zeros(len(texts) - len(pieces), dtype=np.int64)])
+
+        order = np.lexsort((table_positions, table_indices))
+        order = order[lengths[order] > 0]
+        return (
+            np.cumsum(lengths[order]) - lengths[order],
+            list(texts[order]),
+            table_indices[order],
+            table_positions[order],
+            widths[order],
+            steps[order],
+        )
+
+    def frame(self):
+        """the view as a DataFrame with one row per character (and per element row), as in the "chars" backend."""
+        result = []
+        cleared = self.cleared
+        for irow in range(len(self.positions)):
+            position = self.positions[irow]
+            if self.is_text[irow]:
+                for ichar, char in enumerate(self.plain[position:position + self.row_lengths[irow]]):
+                    char_position = position + ichar
+                    icleared = np.searchsorted(cleared[:, 1], char_position, side="right")
+                    if char_position in self.char_overlay:
+                        current = self.char_overlay[char_position]
+                    elif icleared < len(cleared) and cleared[icleared, 0] <= char_position:
+                        current = ""
+                    else:
+                        current = char
+                    result.append((irow, char_position, None, "text", current, char))
+            else:
+                result.append((
+                    irow, position, self.els[irow], self.row_types[irow],
+                    self.slot_overlay.get(irow, ""), ""
+                ))
+        return pd.DataFrame(result, columns=[
+            "table_index", "table_position", "el", "row_type", "char", "char_immutable"
+        ])
@@ -1,39 +1,111 @@
-import numpy as np
+import io
+import os
+import pandas as pd
 import json
-from .converters import flat_tree2position_table, flatten_tree, standoff2tree
+from lxml import etree
+from .base import PositionTable
+from .columnar import ColumnarPositionTable
+from .converters import tree2position_table, standoff2tree, iterparse2position_table
+from .cache import TableCache, parse_cached, position_table2arrays
 from .utils import get_order_for_traversal, create_el_from_so
 
+TABLE_ENGINES = {
+    "pandas": PositionTable,
+    "columnar": ColumnarPositionTable,
+}
+
+HEADER_MODES = ["keep", "lazy", "skip"]
+
 
 class Standoff:
     """Contains a reference to the etree.Element object and the corresponding ContextItem object to link the two representations.
     """
-    def __init__(self, tei_tree, namespaces={}):
+    def __init__(self, tei_tree, namespaces={}, engine="pandas", deferred=False):
         """Create a Converter from a tree element instance.
 
         arguments:
             tei_tree (etree.Element): the etree.Element instance.
+            namespaces (dict): namespaces of the tree, for example {"tei": "http://www.tei-c.org/ns/1.0"}.
+            engine (str): implementation of the position table. "pandas" keeps the table in a pandas.DataFrame, "columnar" keeps it in parallel arrays and builds `table.df` only on access.
+            deferred (bool): if True, edits only change the table and the etree is brought up to date when `tree` or `text_el` is accessed (see `materialize`). Can be changed later on.
 
         returns:
             (Standoff): The created Standoff instance.
         """
 
+        if engine not in TABLE_ENGINES:
+            raise ValueError(f"unknown table engine {engine}, choose one of {list(TABLE_ENGINES)}.")
+
         if "tei" not in namespaces:
             namespaces = {"tei": ""}
 
-        self.tei_tree = tei_tree
-
-        texts = self.tei_tree.findall(".//tei:text", namespaces=namespaces)
+        texts = tei_tree.findall(".//tei:text", namespaces=namespaces)
         if len(texts) == 0:
             raise ValueError("No text attribute found.")
         elif len(texts)>1:
             raise ValueError("More than one text element is not supported.")
-        else:
-            self.text_el = texts[0]
+        text_el = texts[0]
+
+        text_el.tail = None # remove trailing whitespace of text element
+
+        self.__setup(tei_tree, text_el, tree2position_table(text_el, TABLE_ENGINES[engine]), deferred)
+
+    def __setup(self, tei_tree, text_el, table, deferred, header=(None, None)):
+        self.tei_tree = tei_tree
+        self.text_el_ = text_el
+        self.table_ = table
+        self.deferred = deferred
+        self.dirty_ = set()
+        self.header_ = header
 
-        self.text_el.tail = None # remove trailing whitespace of text element
+    @classmethod
+    def from_file(cls, source, namespaces={}, engine="pandas", deferred=False, header="keep", cache=None):
+        """Create a Standoff from an XML file. The file is parsed with `etree.iterparse` and the position table is filled while parsing.
 
-        flat_tree = flatten_tree(self.text_el)
-        self.table_ = flat_tree2position_table(flat_tree)
+        arguments:
+            source (str or file): path or file object of the TEI XML file.
+            namespaces (dict): namespaces of the tree, for example {"tei": "http://www.tei-c.org/ns/1.0"}.
+            engine (str): see `__init__`.
+            deferred (bool): see `__init__`.
+            header (str): what to do with the <teiHeader>. "keep" keeps it in the tree, "lazy" keeps it serialized and only puts it back into the tree when `tree` is accessed, "skip" leaves an empty <teiHeader> in the tree.
+            cache (standoffconverter.TableCache or str): cache (or directory of a cache) for the position table. If the file has been converted before with the same text namespace, the file is only parsed and the table is loaded from the cache.
+
+        returns:
+            (Standoff): The created Standoff instance.
+        """
+        if engine not in TABLE_ENGINES:
+            raise ValueError(f"unknown table engine {engine}, choose one of {list(TABLE_ENGINES)}.")
+        if header not in HEADER_MODES:
+            raise ValueError(f"unknown header mode {header}, choose one of {HEADER_MODES}.")
+
+        namespace = namespaces.get("tei", "")
+        prefix = "{" + namespace + "}" if namespace != "" else ""
+
+        text_tag = prefix + "text"
+        args = (text_tag, prefix + "teiHeader", header, TABLE_ENGINES[engine])
+        if cache is None:
+            parsed = iterparse2position_table(source, *args)
+        else:
+            if not isinstance(cache, TableCache):
+                cache = TableCache(cache)
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, "rb") as f:
+                    content = f.read()
+            else:
+                content = source.read()
+
+            key = cache.key(content, text_tag)
+            arrays = cache.load(key)
+            parsed = None if arrays is None else parse_cached(content, arrays, *args)
+            if parsed is None:
+                parsed = iterparse2position_table(io.BytesIO(content), *args)
+                cache.store(key, position_table2arrays(parsed[2], parsed[1]))
+
+        tei_tree, text_el, table, header_el, header_bytes = parsed
+
+        so = cls.__new__(cls)
+        so.__setup(tei_tree, text_el, table, deferred, (header_el, header_bytes))
+        return so
 
     @property
     def table(self):
@@ -41,26 +113,54 @@ class Standoff:
 
 >>> table.df
     position row_type      el  depth  text
-0          0     open    text    0.0  None
-1          0     open    body    1.0  None
-2          0     open       p    2.0  None
-3          0     text    None    NaN     1
-4          1     text    None    NaN
-5          2     text    None    NaN     2
-6          3     text    None    NaN
-7          4     text    None    NaN     3
-8          5    close       p    2.0  None
-9          5    close    body    1.0  None
-10         5    close    text    0.0  None
-
-where the column `position` refers to the character position and `el` is a pointer to the actual etree.Element."""
+0          0     open    text      0  None
+1          0     open    body      1  None
+2          0     open       p      2  None
+3          0     text    None   <NA>     1
+4          1     text    None   <NA>
+5          2     text    None   <NA>     2
+6          3     text    None   <NA>
+7          4     text    None   <NA>     3
+8          5    close       p      2  None
+9          5    close    body      1  None
+10         5    close    text      0  None
+
+where the column `position` refers to the character position and `el` is a pointer to the actual etree.Element. `row_type` is categorical and `depth` a nullable integer that is missing for text rows."""
         return self.table_
 
     @property
     def tree(self):
         """tree of the TEI XML."""
+        self.materialize()
+        header_el, header_bytes = self.header_
+        if header_bytes is not None:
+            restored = etree.fromstring(header_bytes)
+            restored.tail = header_el.tail
+            header_el.getparent().replace(header_el, restored)
+            self.header_ = (None, None)
         return self.tei_tree
 
+    @property
+    def text_el(self):
+        """the <text> element of the TEI XML."""
+        self.materialize()
+        return self.text_el_
+
+    def materialize(self):
+        """Bring the etree up to date with the table. In deferred mode, the subtrees of the parents of all elements
+        that were added or removed since the last call are rebuilt from the table, each one only once."""
+        if len(self.dirty_) == 0:
+            return
+
+        dirty = {el for el in self.dirty_ if el in self.table}
+        self.dirty_ = set()
+        for el in self.table.in_document_order(dirty):
+            parent = self.table.get_parent(el)
+            while parent is not None and parent not in dirty:
+                parent = self.table.get_parent(parent)
+            if parent is None:
+                self.recreate_subtree(el)
+
     @property
     def plain(self):
         """Plain text string of all text inside the <text> element of the TEI XML."""
@@ -117,12 +217,17 @@ where the column `position` refers to the character position and `el` is a point
         """
 
         begin_ctx = self.table.get_context_at_pos(begin)
+        end_ctx = self.table.get_context_at_pos(max(begin, end-1))
+
+        return self.__unique_parents(begin_ctx, end_ctx, depth)
+
+    @staticmethod
+    def __unique_parents(begin_ctx, end_ctx, depth):
         if depth is not None:
             begin_parents = begin_ctx[:int(depth)]
         else:
             begin_parents = begin_ctx
 
-        end_ctx = self.table.get_context_at_pos(max(begin, end-1))
         if depth is not None:
             end_parents = end_ctx[:int(depth)]
         else:
@@ -138,8 +243,26 @@ where the column `position` refers to the character position and `el` is a point
         if begin_parents != end_parents:
             raise ValueError("no unique context found")
 
+        if any(isinstance(parent, etree._Comment) for parent in parents):
+            raise ValueError("elements cannot be added inside of comments")
+
         return parents
 
+    def __check_span(self, begin, end, parents, new_depth, empty_depths=None):
+        """raise a ValueError if an element from `begin` to `end` at depth `new_depth` within `parents` would not nest properly with the elements of the table.
+        `empty_depths` are the possible depths of an empty element at `begin`, by default those of the table."""
+        if begin == end:
+            if empty_depths is None:
+                empty_depths = self.table.empty_depths(begin)
+            if new_depth not in empty_depths:
+                raise ValueError(f"no place for an empty element at depth {new_depth} at {begin}.")
+            return
+        if new_depth > len(parents):
+            raise ValueError(f"depth {new_depth} is deeper than the context of the span ({begin}, {end}).")
+        for el, el_begin, el_end, _ in self.table.get_elements_in_range(begin, end):
+            if el_begin < el_end and (el_begin < begin or el_end > end) and el not in parents:
+                raise ValueError(f"the span ({begin}, {end}) crosses the element {el.tag} ({el_begin}, {el_end}).")
+
     def get_children(self, begin, end, depth):
         """Get all children context.
 
@@ -149,79 +272,77 @@ where the column `position` refers to the character position and `el` is a point
         depth (int)-- depth of current element
 
         returns:
-            children (list) -- list of children elements ordered by depth (closest is first).
+            children (list) -- list of all elements that would be enclosed by an element spanning from `begin` to `end` at depth `depth`, in document order of their end.
         """
-        begin_ctx = self.table.get_context_at_pos(begin)
+        if begin == end:
+            return []
 
         if depth is None:
-            depth = len(begin_ctx)
+            depth = len(self.table.get_context_at_pos(begin))
 
-        children = set(begin_ctx[int(depth):])
+        return self.table.get_children(begin, end, depth)
 
-        if not (self.table.df.position==begin).any():
-            # begin not in self.table.df.position
-            slice_ = self.table.df[np.logical_and(
-                self.table.df.position < begin,
-                self.table.df.row_type == "text"
-            )]
+    def elements_in_range(self, begin, end, contained=False):
+        """Get the standoff elements within a range of characters.
 
-            begin_idx = slice_.iloc[-1].name
+        arguments:
+        begin (int)-- beginning character position within the XML
+        end (int)-- ending character position within the XML
+        contained (bool)-- if True, only elements that lie completely within `begin` and `end` are returned. Otherwise, all elements that overlap with the range, including the enclosing ones.
 
-        else:
-            begin_idx = self.table.df[np.logical_and(
-                self.table.df.position == begin,
-                self.table.df.row_type == "text"
-            )].iloc[0].name
-
-        children = set()
-        cache = set()
-        c_row_pos = begin
-        c_row_idx = begin_idx
-        while c_row_pos <= end and c_row_idx < self.table.df.index.stop:
-            c_row = self.table.df.loc[c_row_idx]
-            c_row_pos = c_row.position
-
-            if c_row.row_type == "open":
-                cache.add(c_row.el)
-            if c_row.row_type == "close" and c_row.el in cache:
-                children.add(c_row.el)
-            c_row_idx += 1
-
-        return list(children)
+        returns:
+            elements (list) -- list of dicts with the keys "el", "begin", "end" and "depth" (as in `standoffs`) in document order. Elements without text count as in the range if they are positioned between `begin` and `end`.
+        """
+        return [
+            {"el": el, "begin": el_begin, "end": el_end, "depth": depth}
+            for el, el_begin, el_end, depth in self.table.get_elements_in_range(begin, end, contained)
+        ]
 
     def add_standoff(self, begin, end, tag, attrib):
         raise NotImplementedError()
 
-    def __replace_el(self, old_el, new_el):
+    def __add_to_tree(self, new_el):
+        """Put the new element `new_el` into the etree where the table has it. The elements and the text
+        that it encloses are moved into it, everything else in the etree stays as it is."""
+        parent = self.table.get_parent(new_el)
+        previous = self.table.get_previous_sibling(new_el)
+
+        if previous is None:
+            parent.insert(0, new_el)
+            parent.text = self.table.get_texts(parent)[0]
+        else:
+            previous.addnext(new_el)
+            previous.tail = self.table.get_texts(previous)[1]
+
+        for child in self.table.get_direct_children(new_el):
+            new_el.append(child)
+            child.tail = self.table.get_texts(child)[1]
 
-        second_parent = old_el.getparent()
+        new_el.text, new_el.tail = self.table.get_texts(new_el)
 
-        # and replace the subtree
-        if second_parent is None:
-            new_el.tail = self.text_el.tail
-            self.text_el = new_el
+    def __remove_from_tree(self, del_el, parent, previous):
+        """Take `del_el` out of the etree after it was removed from the table. Its children and text
+        are moved into `parent` where `del_el` was, `previous` is the sibling that preceded it."""
+        children = list(del_el)
+        for child in children:
+            del_el.addprevious(child)
+        parent.remove(del_el)
+
+        if previous is None:
+            parent.text = self.table.get_texts(parent)[0]
         else:
-            new_el.tail = old_el.tail
-            second_parent.replace(
-                old_el,
-                new_el
-            )
+            previous.tail = self.table.get_texts(previous)[1]
+
+        for child in children:
+            child.tail = self.table.get_texts(child)[1]
 
     def recreate_subtree(self, parent):
         # extract part of the standoff table that needs to be recreated
         # as etree
-        parent_begin, parent_end = self.table.df.loc[self.table.df.el == parent].index
-        to_update = self.table.df.iloc[parent_begin:parent_end]
+        to_update = self.table.get_el_slice(parent)
 
-        # now, recreate the subtree this element is in
-        new_parent_el, old_els2new_els = standoff2tree(to_update)
-
-        for old_el, new_el in old_els2new_els.items():
-            self.table.set_el(old_el, {"el": new_el})
-        self.__replace_el(
-            parent,
-            new_parent_el
-        )
+        # now, rebuild the subtree this element is in from its own elements
+        standoff2tree(to_update, reuse_els=True)
 
 
     def add_inline(self, begin, end, tag, depth=None, attrib=None, insert_index_at_pos=0):
@@ -234,25 +355,27 @@ where the column `position` refers to the character position and `el` is a point
         tag (str)-- tag name, for example 'text' for <text>.
         depth (int)-- depth where to add the element. If None, it will be added deepest
         attrib (dict)-- dictionary of items that go into the attrib of etree.Element. Ultimately, attributes within tags. for example {"resp":"machine"} will result in <SOMETAG resp="machine">.
+
+        returns:
+            element (etree.Element) -- the new element. Elements keep their identity across all later edits, so it can be passed to `remove_inline` directly.
         """
 
         attrib = attrib if attrib is not None else {}
 
+        if not self.deferred:
+            self.materialize()
+
         # First, create a new element and get parents and children
         new_el = create_el_from_so(tag, attrib)
         parents = self.get_parents(begin, end, depth)
 
-        parent = parents[-1]
-
         # DEPTH handling
         # set own depth and increase children's depth by one
         new_depth = depth if depth is not None else len(parents)
+        self.__check_span(begin, end, parents, new_depth)
 
         children = self.get_children(begin, end, new_depth)
-
-        for child in children:
-            child_depth = self.table.df[self.table.df.el==child].iloc[0].depth
-            self.table.set_el(child, {"depth":child_depth+1} )
+        self.table.shift_depth(children, 1)
 
         if begin == end:
             self.table.insert_empty(begin, new_el, new_depth, insert_index_at_pos=insert_index_at_pos)
@@ -260,7 +383,174 @@ where the column `position` refers to the character position and `el` is a point
             self.table.insert_open(begin, new_el, new_depth)
             self.table.insert_close(end, new_el, new_depth)
 
-        self.recreate_subtree(parent)
+        if self.deferred:
+            self.dirty_.add(self.table.get_parent(new_el))
+        else:
+            self.__add_to_tree(new_el)
+
+        return new_el
+
+    def add_inline_many(self, annotations):
+        """Add many standoff elements to the structure at once.
+        All rows are merged into the table in a single pass before the new elements are put into the etree. The result is the same as calling `add_inline` for each annotation, outer annotations first.
+
+        arguments:
+        annotations (list or pandas.DataFrame)-- (begin, end, tag, depth, attrib) rows, either as tuples, as dicts or as the rows of a DataFrame with these columns. `depth` and `attrib` are optional.
+
+        returns:
+            elements (list) -- the created etree.Elements in the order of `annotations`.
+        """
+        annotations = self.__normalize_annotations(annotations)
+
+        if not self.deferred:
+            self.materialize()
+
+        # outer annotations first, so that nested ones see their new parents
+        order = sorted(
+            range(len(annotations)),
+            key=lambda i: (annotations[i]["begin"], -annotations[i]["end"])
+        )
+
+        # compute parents and depths before the table is changed. New elements
+        # that enclose an annotation are inserted into its context.
+        new_els = [None] * len(annotations)
+        new_depths = [None] * len(annotations)
+        text_depths = {}
+        stack = []
+        for i in order:
+            ann = annotations[i]
+            while len(stack) > 0 and annotations[stack[-1]]["end"] <= ann["begin"]:
+                stack.pop()
+            if len(stack) > 0 and annotations[stack[-1]]["end"] < ann["end"]:
+                raise ValueError("annotations are overlapping")
+
+            begin_ctx = self.table.get_context_at_pos(ann["begin"])
+            end_ctx = self.table.get_context_at_pos(max(ann["begin"], ann["end"]-1))
+            for j in sorted(stack, key=lambda j: new_depths[j]):
+                begin_ctx.insert(int(new_depths[j]), new_els[j])
+                end_ctx.insert(int(new_depths[j]), new_els[j])
+
+            parents = self.__unique_parents(begin_ctx, end_ctx, ann["depth"])
+            new_els[i] = create_el_from_so(ann["tag"], ann["attrib"])
+            new_depths[i] = ann["depth"] if ann["depth"] is not None else len(parents)
+            if ann["begin"] == ann["end"]:
+                # empty elements are checked once the levels at their position are known
+                text_depths[i] = len(begin_ctx)
+            else:
+                self.__check_span(ann["begin"], ann["end"], parents, new_depths[i])
+
+            # new elements with the same span at the same depth or deeper become children,
+            # new elements with a larger span cannot be children
+            for j in stack:
+                outer = annotations[j]
+                same_span = (outer["begin"], outer["end"]) == (ann["begin"], ann["end"])
+                if same_span and new_depths[j] >= new_depths[i]:
+                    new_depths[j] += 1
+                elif ann["begin"] < ann["end"] and new_depths[j] >= new_depths[i]:
+                    raise ValueError(f"the span ({ann['begin']}, {ann['end']}) crosses the element {outer['tag']} ({outer['begin']}, {outer['end']}).")
+            stack.append(i)
+
+        spans = [i for i in order if annotations[i]["begin"] < annotations[i]["end"]]
+        empties = [i for i in order if annotations[i]["begin"] == annotations[i]["end"]]
+
+        # the levels at the position of an empty element once the other elements are
+        # inserted: those of the table with the new depths and those of the new rows
+        if len(empties) > 0:
+            children = []
+            try:
+                for i in spans:
+                    children.append(self.get_children(annotations[i]["begin"], annotations[i]["end"], new_depths[i]))
+                    self.table.shift_depth(children[-1], 1)
+
+                new_levels = {}
+                for i in spans:
+                    for key in ("begin", "end"):
+                        new_levels.setdefault(annotations[i][key], set()).add(new_depths[i] + 1)
+                for i in empties:
+                    pos = annotations[i]["begin"]
+                    levels = self.table.empty_depths(pos, text_depths[i]) | new_levels.get(pos, set())
+                    self.__check_span(pos, pos, None, new_depths[i], levels)
+                    new_levels.setdefault(pos, set()).add(new_depths[i])
+            finally:
+                for els in reversed(children):
+                    self.table.shift_depth(els, -1)
+
+        self.table.split_at(
+            [ann["begin"] for ann in annotations] + [ann["end"] for ann in annotations]
+        )
+
+        rows = []
+        gaps = []
+        for i in spans:
+            ann = annotations[i]
+
+            # DEPTH handling
+            children = self.get_children(ann["begin"], ann["end"], new_depths[i])
+            self.table.shift_depth(children, 1)
+
+            for key, row_type in (("begin", "open"), ("end", "close")):
+                rows.append((ann[key], row_type, new_els[i], new_depths[i]))
+                gaps.append(self.table.insert_index(ann[key], row_type, new_depths[i]))
+
+        self.table.insert_many(rows, gaps)
+
+        # empty elements go where `add_inline` puts them. Those at the same position are
+        # inserted one after the other, as each one is a possible place for the next.
+        rounds = {}
+        for i in empties:
+            rounds.setdefault(annotations[i]["begin"], []).append(i)
+        for rank in range(max((len(ids) for ids in rounds.values()), default=0)):
+            self.table.insert_many([
+                (annotations[ids[rank]]["begin"], "empty", new_els[ids[rank]], new_depths[ids[rank]])
+                for ids in rounds.values() if len(ids) > rank
+            ])
+
+        if self.deferred:
+            self.dirty_.update(self.table.get_parent(new_el) for new_el in new_els)
+        else:
+            # outer elements first, so that the parents of nested ones are in the etree already
+            for new_el in self.table.in_document_order(new_els):
+                self.__add_to_tree(new_el)
+
+        return new_els
+
+    def __normalize_annotations(self, annotations):
+
+        if isinstance(annotations, pd.DataFrame):
+            annotations = annotations.to_dict("records")
+
+        keys = ["begin", "end", "tag", "depth", "attrib"]
+        normalized = []
+        for ann in annotations:
+            if not isinstance(ann, dict):
+                ann = dict(zip(keys, ann))
+
+            depth = ann.get("depth")
+            if depth is not None and pd.isnull(depth):
+                depth = None
+            attrib = ann.get("attrib")
+            attrib = attrib if isinstance(attrib, dict) else {}
+
+            try:
+                begin, end = int(ann["begin"]), int(ann["end"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("begin and end have to be integer positions.")
+            if not 0 <= begin <= end <= len(self.plain):
+                raise ValueError(f"invalid span ({begin}, {end}).")
+            if not isinstance(ann.get("tag"), str) or ann["tag"] == "":
+                raise ValueError("tag has to be a non-empty string.")
+            if depth is not None and int(depth) < 1:
+                raise ValueError("depth has to be at least 1.")
+
+            normalized.append({
+                "begin": begin,
+                "end": end,
+                "tag": ann["tag"],
+                "depth": None if depth is None else int(depth),
+                "attrib": attrib,
+            })
+
+        return normalized
 
     def remove_inline(self, del_el):
         """Remove a standoff element from the structure.
@@ -270,35 +560,24 @@ where the column `position` refers to the character position and `el` is a point
         del_el (etree.Element)-- the element that should be removed
 
         """
-        el_open_row = self.table.df[np.logical_and(
-            self.table.df.el == del_el,
-            self.table.df.row_type.isin(["open", "empty"])
-        )].iloc[0]
+        if not self.deferred:
+            self.materialize()
 
-        el_close_row = self.table.df[np.logical_and(
-            self.table.df.el == del_el,
-            self.table.df.row_type.isin(["close", "empty"])
-        )].iloc[0]
+        parent = self.table.get_parent(del_el)
+        previous = self.table.get_previous_sibling(del_el)
 
-        begin = el_open_row.position
-        end = el_close_row.position
-        depth = el_open_row.depth
-
-        parents = self.get_parents(begin, end, depth)
-
-        parent = parents[-1]
-
-        children = self.get_children(begin, end, depth)
+        children = self.table.get_descendants(del_el)
 
         # DEPTH handling
         # decrease children's depth by one
-        for child in children:
-            child_depth = self.table.df[self.table.df.el==child].iloc[0].depth
-            self.table.set_el(child, {"depth":child_depth-1} )
+        self.table.shift_depth(children, -1)
 
         self.table.remove_el(del_el)
 
-        self.recreate_subtree(parent)
+        if self.deferred:
+            self.dirty_.add(parent)
+        else:
+            self.__remove_from_tree(del_el, parent, previous)
 
 
     def add_span(self, begin, end, tag, depth, attrib, id_=""):
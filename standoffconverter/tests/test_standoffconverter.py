@@ -1,7 +1,10 @@
 import unittest
 import os
+import io
+import tempfile
 from lxml import etree
 
+import numpy as np
 import standoffconverter
 from spacy.lang.en import English
 
@@ -218,6 +221,122 @@ class TestStandoffConverter(unittest.TestCase):
                 attrib={"resp":"machine"}
             )
 
+    def test_add_annotation_fail3(self):
+        tree = etree.fromstring(b"<TEI><teiHeader/><text><body><p>ab<hi>cd<b>ef</b>gh</hi>ij<lb/>kl</p><p>mn<note>op</note>qr</p></body></text></TEI>")
+        so = standoffconverter.Standoff(tree)
+        n_rows = len(so.table.df)
+
+        # crosses the note element at the given depth
+        with self.assertRaises(ValueError):
+            so.add_inline(begin=15, end=17, tag="xx", depth=3, attrib={})
+        # deeper than the context of the span
+        with self.assertRaises(ValueError):
+            so.add_inline(begin=2, end=4, tag="xx", depth=5, attrib={})
+        # no empty element can be placed at this depth
+        with self.assertRaises(ValueError):
+            so.add_inline(begin=14, end=14, tag="xx", depth=2, attrib={})
+
+        output_xml = etree.tostring(so.text_el).decode("utf-8")
+        self.assertTrue(len(so.table.df) == n_rows)
+        self.assertTrue(output_xml == "<text><body><p>ab<hi>cd<b>ef</b>gh</hi>ij<lb/>kl</p><p>mn<note>op</note>qr</p></body></text>")
+
+    def test_add_inline_many_1(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        new_els = so.add_inline_many([
+            (2, 3, "vv", None, {"resp": "machine"}),
+            (0, 5, "xx", None, None),
+            (4, 4, "lb", None, None),
+            (19, 21, "yy", None, None),
+        ])
+        output_xml = etree.tostring(so.text_el).decode("utf-8")
+        expected_out = '<text><body><p><xx>1 <vv resp="machine">2</vv> <lb/>3</xx> 4 5 6 7 9 10</p><p> <yy>11</yy><lb/> 12 13 14</p></body></text>'
+
+        self.assertTrue(expected_out == output_xml)
+        self.assertTrue([el.tag for el in new_els] == ["vv", "xx", "lb", "yy"])
+
+    def test_add_inline_many_2(self):
+        import pandas as pd
+
+        annotations = pd.DataFrame([
+            {"begin": 2, "end": 3, "tag": "xx", "depth": 3, "attrib": {"resp":"machine"}},
+            {"begin": 2, "end": 3, "tag": "vv", "depth": 3, "attrib": {"resp":"machine"}},
+            {"begin": 6, "end": 9, "tag": "ww"},
+        ])
+
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline_many(annotations)
+
+        tree = etree.fromstring(input_xml1)
+        so_sequential = standoffconverter.Standoff(tree)
+        so_sequential.add_inline(begin=2, end=3, tag="xx", depth=3, attrib={"resp":"machine"})
+        so_sequential.add_inline(begin=2, end=3, tag="vv", depth=3, attrib={"resp":"machine"})
+        so_sequential.add_inline(begin=6, end=9, tag="ww")
+
+        self.assertTrue(
+            etree.tostring(so.text_el) == etree.tostring(so_sequential.text_el)
+        )
+        self.assertTrue(
+            list(so.table.df.depth.fillna(-1)) == list(so_sequential.table.df.depth.fillna(-1))
+        )
+
+    def test_add_inline_many_empty_at_boundaries(self):
+        input_xml = b"<TEI><teiHeader/><text><body><p>ab<hi>cd<b>ef</b>gh</hi>ij<lb/>kl</p><p>mn<note>op</note>qr</p></body></text></TEI>"
+        batches = [
+            (input_xml1, [(3, 5, "xx", None), (5, 5, "yy", 4)]),
+            (input_xml1, [(5, 5, "yy", 3), (5, 8, "xx", 3)]),
+            (input_xml1, [(3, 5, "xx", None), (5, 5, "yy", None), (5, 5, "zz", None), (5, 7, "vv", None)]),
+            (input_xml, [(14, 14, "yy", None), (12, 14, "xx", None)]),
+            (input_xml, [(12, 14, "xx", None), (12, 12, "yy", None), (14, 14, "zz", 4)]),
+        ]
+        for xml, annotations in batches:
+            so = standoffconverter.Standoff(etree.fromstring(xml))
+            so_sequential = standoffconverter.Standoff(etree.fromstring(xml))
+            unchanged = etree.tostring(so.text_el)
+
+            sequential_error = None
+            try:
+                for annotation in sorted(annotations, key=lambda ann: (ann[0], -ann[1])):
+                    so_sequential.add_inline(*annotation)
+            except ValueError as e:
+                sequential_error = e
+
+            if sequential_error is not None:
+                with self.assertRaises(ValueError):
+                    so.add_inline_many(annotations)
+                self.assertTrue(etree.tostring(so.text_el) == unchanged)
+                continue
+
+            so.add_inline_many(annotations)
+            self.assertTrue(
+                etree.tostring(so.text_el) == etree.tostring(so_sequential.text_el)
+            )
+            self.assertTrue(
+                list(so.table.df.depth.fillna(-1)) == list(so_sequential.table.df.depth.fillna(-1))
+            )
+
+    def test_add_inline_many_fail(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        n_rows = len(so.table.df)
+
+        with self.assertRaises(ValueError):
+            so.add_inline_many([(2, 4, "xx"), (3, 5, "xx")])
+        with self.assertRaises(ValueError):
+            so.add_inline_many([(17, 19, "xx")])
+        with self.assertRaises(ValueError):
+            so.add_inline_many([(2, 40, "xx")])
+        # explicit depths that cross an existing or a new element
+        with self.assertRaises(ValueError):
+            so.add_inline_many([(2, 4, "xx"), (17, 19, "xx", 2)])
+        with self.assertRaises(ValueError):
+            so.add_inline_many([(2, 8, "xx"), (3, 5, "xx", 3)])
+
+        output_xml = etree.tostring(so.text_el).decode("utf-8")
+        self.assertTrue(len(so.table.df) == n_rows)
+        self.assertTrue(output_xml == "<text><body><p>1 2 3 4 5 6 7 9 10</p><p> 11<lb/> 12 13 14</p></body></text>")
+
     def test_add_empty_element(self):
 
         tree = etree.fromstring(input_xml1)
@@ -438,6 +557,84 @@ class TestStandoffConverter(unittest.TestCase):
             output_xml == expected_output
         )
 
+    def test_remove_annotation_after_empty(self):
+
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=18, end=18, tag="lb", depth=None, attrib={})
+        second_p = [it["el"] for it in so.standoffs if it["el"].tag == "p"][1]
+        so.remove_inline(second_p)
+
+        output_xml = etree.tostring(so.text_el).decode("utf-8")
+        expected_output = '<text><body><p>1 2 3 4 5 6 7 9 10<lb/></p> 11<lb/> 12 13 14</body></text>'
+        self.assertTrue(output_xml == expected_output)
+        self.assertTrue(
+            [it["depth"] for it in so.standoffs] == [0, 1, 2, 3, 2]
+        )
+
+    def test_columnar_engine(self):
+
+        sos = [
+            standoffconverter.Standoff(etree.fromstring(input_xml1), engine=engine)
+            for engine in ["pandas", "columnar"]
+        ]
+        for so in sos:
+            so.add_inline(begin=2, end=3, tag="vv", depth=None, attrib={"resp":"machine"})
+            so.add_inline(begin=0, end=5, tag="xx", depth=None, attrib={})
+            so.add_inline(begin=21, end=21, tag="lb", depth=None, attrib={})
+            so.remove_inline([it["el"] for it in so.standoffs if it["el"].tag == "vv"][0])
+
+        self.assertTrue(
+            etree.tostring(sos[0].text_el) == etree.tostring(sos[1].text_el)
+        )
+        self.assertTrue(sos[0].plain == sos[1].plain)
+        self.assertTrue(
+            list(sos[0].table.df.depth.fillna(-1)) == list(sos[1].table.df.depth.fillna(-1))
+        )
+
+        for values in [{"row_type": "empty", "depth": 4}, {"depth": None}]:
+            for so in sos:
+                lb = [it["el"] for it in so.standoffs if it["el"].tag == "lb"][0]
+                so.table.set_el(lb, values)
+            self.assertTrue(list(sos[0].table.df.row_type) == list(sos[1].table.df.row_type))
+            self.assertTrue(
+                list(sos[0].table.df.depth.fillna(-1)) == list(sos[1].table.df.depth.fillna(-1))
+            )
+
+        with self.assertRaises(ValueError):
+            standoffconverter.Standoff(etree.fromstring(input_xml1), engine="sql")
+
+    def test_element_index(self):
+
+        for engine in ["pandas", "columnar"]:
+            tree = etree.fromstring(input_xml1)
+            so = standoffconverter.Standoff(tree, engine=engine)
+            so.add_inline(begin=2, end=3, tag="vv", depth=None, attrib={})
+            so.add_inline(begin=0, end=5, tag="xx", depth=None, attrib={})
+            so.add_inline_many([(7, 7, "lb"), (21, 24, "yy")])
+            so.remove_inline([it["el"] for it in so.standoffs if it["el"].tag == "vv"][0])
+            so.add_inline(begin=2, end=3, tag="vv", depth=None, attrib={})
+
+            for it in so.standoffs:
+                self.assertTrue(
+                    so.table.get_span(it["el"]) == (it["begin"], it["end"], it["depth"])
+                )
+
+    def test_split_at(self):
+
+        for engine in ["pandas", "columnar"]:
+            tree = etree.fromstring(input_xml1)
+            so = standoffconverter.Standoff(tree, engine=engine)
+            n_rows = len(so.table)
+            so.table.split_at([5, 3, 5, 0, 19])
+
+            positions = list(so.table.df.position)
+            self.assertTrue(len(so.table) == n_rows + 3)
+            self.assertTrue(3 in positions and 5 in positions and 19 in positions)
+            self.assertTrue(positions == sorted(positions))
+            self.assertTrue("".join(so.table.df.text.dropna()) == so.plain)
+            self.assertTrue(so.table.get_context_at_pos(4) == so.table.get_context_at_pos(3))
+
     def test_add_remove_annotation1(self):
 
         tree = etree.fromstring(input_xml1)
@@ -555,6 +752,479 @@ class TestStandoffConverter(unittest.TestCase):
             output_xml == expected_output
         )
 
+    def test_context_at_pos(self):
+        tree = etree.fromstring(input_xml5)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=15, end=18, tag="xx", depth=None, attrib={})
+
+        self.assertTrue(isinstance(so.table.get_context_at_pos(2)[-1], etree._Comment))
+        self.assertTrue(str(so.table.get_context_at_pos(14)) == "text>body>p")
+        self.assertTrue(str(so.table.get_context_at_pos(16)) == "text>body>p>xx")
+        self.assertTrue(str(so.table.get_context_at_pos(18)) == "text>body>p")
+
+        xx = [it["el"] for it in so.standoffs if it["el"].tag == "xx"][0]
+        self.assertTrue(so.table.get_parent(xx) is xx.getparent())
+
+        with self.assertRaises(ValueError):
+            so.add_inline(begin=2, end=4, tag="xx", depth=None, attrib={})
+
+        # a broken element index must not hang
+        body, p = so.table.get_context_at_pos(14)[1:3]
+        so.table.el_parents_[so.table.el_ids_[body]] = so.table.el_ids_[p]
+        with self.assertRaises(ValueError):
+            so.table.get_context_at_pos(14)
+
+    def test_elements_in_range(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=2, end=3, tag="vv", depth=None, attrib={})
+        so.add_inline(begin=0, end=5, tag="xx", depth=None, attrib={})
+
+        contained = so.elements_in_range(0, 5, contained=True)
+        self.assertTrue([it["el"].tag for it in contained] == ["xx", "vv"])
+        self.assertTrue([(it["begin"], it["end"]) for it in contained] == [(0, 5), (2, 3)])
+
+        overlapping = so.elements_in_range(3, 19)
+        self.assertTrue(
+            [it["el"].tag for it in overlapping] == ["text", "body", "p", "xx", "p"]
+        )
+
+        self.assertTrue(
+            [it["el"].tag for it in so.elements_in_range(21, 21, contained=True)] == ["lb"]
+        )
+
+    def test_add_annotation_keeps_elements(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        old_els = [it["el"] for it in so.standoffs]
+
+        so.add_inline(begin=19, end=24, tag="xx", depth=None, attrib={})
+        so.add_inline_many([(18, 30, "yy"), (20, 21, "zz")])
+
+        output_xml = etree.tostring(so.text_el).decode("utf-8")
+        expected_output = '<text><body><p>1 2 3 4 5 6 7 9 10</p><p><yy> <xx>1<zz>1</zz><lb/> 12</xx> 13 14</yy></p></body></text>'
+        self.assertTrue(output_xml == expected_output)
+
+        tree_els = list(so.text_el.iter())
+        self.assertTrue(all(any(el is tree_el for tree_el in tree_els) for el in old_els))
+
+    def test_element_identity(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+
+        vv = so.add_inline(begin=2, end=3, tag="vv", depth=None, attrib={})
+        xx = so.add_inline(begin=0, end=5, tag="xx", depth=None, attrib={})
+        old_els = [it["el"] for it in so.standoffs]
+
+        so.remove_inline(xx)
+        so.recreate_subtree(so.text_el)
+        so.remove_inline(vv)
+
+        output_xml = etree.tostring(so.text_el).decode("utf-8")
+        expected_output = "<text><body><p>1 2 3 4 5 6 7 9 10</p><p> 11<lb/> 12 13 14</p></body></text>"
+        self.assertTrue(output_xml == expected_output)
+        self.assertTrue(
+            [id(el) for el in so.text_el.iter()] == [id(el) for el in old_els if el is not vv and el is not xx]
+        )
+
+    def test_deferred(self):
+        so = standoffconverter.Standoff(etree.fromstring(input_xml1))
+        so_deferred = standoffconverter.Standoff(etree.fromstring(input_xml1), deferred=True)
+        tei_before = etree.tostring(so_deferred.tei_tree)
+
+        for so_ in [so, so_deferred]:
+            vv = so_.add_inline(begin=2, end=3, tag="vv", depth=None, attrib={})
+            so_.add_inline(begin=0, end=5, tag="xx", depth=None, attrib={})
+            so_.add_inline_many([(19, 21, "yy"), (25, 25, "lb")])
+            so_.remove_inline(vv)
+
+        self.assertTrue(etree.tostring(so_deferred.tei_tree) == tei_before)
+        self.assertTrue(
+            etree.tostring(so_deferred.tree) == etree.tostring(so.tree)
+        )
+        self.assertTrue(len(so_deferred.dirty_) == 0)
+
+        so_deferred.deferred = False
+        so_deferred.add_inline(begin=7, end=9, tag="zz", depth=None, attrib={})
+        so.add_inline(begin=7, end=9, tag="zz", depth=None, attrib={})
+        self.assertTrue(
+            etree.tostring(so_deferred.text_el) == etree.tostring(so.text_el)
+        )
+
+
+    def test_view_runs_backend(self):
+        tree = etree.fromstring(input_xml6)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=2, end=5, tag="xx", depth=None, attrib={})
+
+        views = [
+            standoffconverter.View(so, backend=backend)
+                .exclude_outside("p")
+                .include_inside("div")
+                .exclude_inside("xx")
+                .insert_tag_text("lb", "\n")
+                .shrink_whitespace()
+            for backend in ["chars", "runs"]
+        ]
+        plain = views[0].get_plain()
+        self.assertTrue(views[1].get_plain() == plain)
+        for i in range(len(plain)):
+            self.assertTrue(
+                views[0].get_table_pos(i) == views[1].get_table_pos(i)
+                and views[0].get_table_index(i) == views[1].get_table_index(i)
+            )
+        self.assertTrue(list(views[0].view.char) == list(views[1].view.char))
+
+        with self.assertRaises(ValueError):
+            standoffconverter.View(so, backend="unknown")
+
+    def test_view_table_pos_many(self):
+        tree = etree.fromstring(input_xml2)
+        so = standoffconverter.Standoff(tree)
+
+        for backend in ["chars", "runs"]:
+            view = standoffconverter.View(so, backend=backend).shrink_whitespace()
+            plain = view.get_plain()
+            indices = list(range(len(plain)))
+
+            table_positions = view.get_table_pos_many(indices)
+            table_indices = view.get_table_index_many(indices)
+            self.assertTrue(
+                list(table_positions) == [view.get_table_pos(i) for i in indices]
+                and list(table_indices) == [view.get_table_index(i) for i in indices]
+            )
+
+            with self.assertRaises(ValueError):
+                view.get_table_pos_many([len(plain)])
+
+    def test_view_plain_pos(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=2, end=5, tag="xx", depth=None, attrib={})
+
+        for backend in ["chars", "runs"]:
+            view = standoffconverter.View(so, backend=backend).exclude_inside("xx")
+            plain = view.get_plain()
+
+            plain_positions = view.get_plain_pos_many(range(len(so.plain)))
+            for table_position in [0, 1, 5, 10]:
+                plain_position = plain_positions[table_position]
+                self.assertTrue(view.get_table_pos(plain_position) == table_position)
+                self.assertTrue(plain[plain_position] == so.plain[table_position])
+
+            self.assertTrue(view.get_plain_pos(3) == plain_positions[5])
+            self.assertTrue(view.get_plain_pos(3, snap="previous") == plain_positions[1])
+            with self.assertRaises(ValueError):
+                view.get_plain_pos(3, snap=None)
+
+            # inserted texts share the position of the next character
+            view = standoffconverter.View(so, backend=backend).insert_tag_text("lb", "\n")
+            plain = view.get_plain()
+            plain_positions = view.get_plain_pos_many(range(len(so.plain)))
+            self.assertTrue(all(plain[plain_positions[p]] == so.plain[p] for p in range(len(so.plain))))
+            self.assertTrue(view.get_plain_pos(21) == plain_positions[21] == plain.index("\n") + 1)
+
+    def test_view_shrink_whitespace_custom(self):
+        tree = etree.fromstring("<TEI><text><body><p>a  b\t\t<lb/>\tc  </p></body></text></TEI>")
+        so = standoffconverter.Standoff(tree)
+
+        for backend in ["chars", "runs"]:
+            view = standoffconverter.View(so, backend=backend)
+            view.insert_tag_text("lb", "\t")
+            view.shrink_whitespace(shrink_to="_", custom_whitespaces=["\t"])
+            self.assertTrue(view.get_plain() == "a  b_c  ")
+
+    def test_view_insert_tag_text_mapping(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=2, end=4, tag="xx", depth=None, attrib={})
+
+        for backend in ["chars", "runs"]:
+            view = standoffconverter.View(so, backend=backend)
+            view.insert_tag_text("lb", "\n").insert_tag_text("xx", "|")
+            expected = view.get_plain()
+
+            view = standoffconverter.View(so, backend=backend)
+            view.insert_tag_text({"lb": "\n", "xx": "|"})
+            self.assertTrue(view.get_plain() == expected)
+            self.assertTrue(expected.count("|") == 2)
+
+            with self.assertRaises(ValueError):
+                view.insert_tag_text("lb")
+
+    def test_view_exclude_many(self):
+        tree = etree.fromstring(
+            "<TEI><text><body><p>"
+            + "".join(f"w{i} <note>n{i} <note>m</note></note> " for i in range(50))
+            + "</p></body></text></TEI>"
+        )
+        so = standoffconverter.Standoff(tree)
+
+        for backend in ["chars", "runs"]:
+            view = standoffconverter.View(so, backend=backend)
+            self.assertTrue(len(view.ranges_inside("note")) == 100)
+            self.assertTrue(
+                view.exclude_inside(["note"]).get_plain()
+                == "".join(f"w{i}  " for i in range(50))
+            )
+            self.assertTrue(
+                view.exclude_outside("note").get_plain() == ""
+            )
+
+    def test_view_nested_tags_and_attrib(self):
+        tree = etree.fromstring(
+            "<TEI><text><body><p>a<note type='editorial'>b<note>c</note>d</note>e"
+            "<note type='authorial'>f</note>g</p></body></text></TEI>"
+        )
+        so = standoffconverter.Standoff(tree)
+
+        for backend in ["chars", "runs"]:
+            view = standoffconverter.View(so, backend=backend)
+            ranges = view.ranges_inside("note")
+            self.assertTrue(len(ranges) == 3)
+            self.assertTrue(all(
+                so.table.df.el[begin] is so.table.df.el[end]
+                for begin, end in ranges
+            ))
+            self.assertTrue(
+                view.exclude_inside("note", attrib={"type": "editorial"}).get_plain() == "aefg"
+            )
+            self.assertTrue(
+                view.exclude_outside("note", attrib={"type": "authorial"}).get_plain() == "f"
+            )
+
+    def test_add_annotation_after_empty_at_end_of_sibling(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        end_of_p = len(tree.find(".//p").text)
+        lb = so.add_inline(begin=end_of_p, end=end_of_p, tag="lb", depth=None, attrib={})
+        so.add_inline(begin=end_of_p, end=end_of_p+2, tag="xx", depth=None, attrib={})
+
+        begin, end, depth = so.table.get_span(lb)
+        self.assertTrue(depth == len(so.table.get_context_at_pos(0)))
+        self.assertTrue(lb.getparent().tag == "p")
+
+    def test_view_pipeline(self):
+        pipeline = (
+            standoffconverter.ViewPipeline()
+                .exclude_inside("xx")
+                .insert_tag_text("lb", "\n")
+                .shrink_whitespace()
+        )
+        for xml in [input_xml1, input_xml2]:
+            so = standoffconverter.Standoff(etree.fromstring(xml))
+            so.add_inline(begin=2, end=5, tag="xx", depth=None, attrib={})
+            eager = (
+                standoffconverter.View(so)
+                    .exclude_inside("xx")
+                    .insert_tag_text("lb", "\n")
+                    .shrink_whitespace()
+            )
+
+            for backend in ["chars", "runs"]:
+                view = pipeline.apply(so, backend=backend)
+                self.assertTrue(len(view.plan_) == 3)
+                plain = view.get_plain()
+                self.assertTrue(len(view.plan_) == 0)
+                self.assertTrue(plain == eager.get_plain())
+                self.assertTrue(
+                    list(view.get_table_pos_many(range(len(plain))))
+                    == list(eager.get_table_pos_many(range(len(plain))))
+                )
+
+    def test_view_cache(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+
+        for backend in ["chars", "runs"]:
+            view = standoffconverter.View(so, backend=backend)
+            plain = view.get_plain()
+            self.assertTrue(view.get_plain() is plain)
+
+            view.insert_tag_text("lb", "\n")
+            self.assertTrue(view.get_plain() != plain)
+            self.assertTrue(view.get_plain() is view.get_plain())
+
+        view = standoffconverter.View(so)
+        plain = view.get_plain()
+        view.view.loc[0, "char"] = "x"
+        self.assertTrue(view.invalidate().get_plain() == "x" + plain)
+
+    def test_view_follows_standoff(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=2, end=5, tag="xx", depth=None, attrib={})
+
+        views = [
+            standoffconverter.View(so, backend=backend)
+                .exclude_inside("xx")
+                .insert_tag_text("lb", "\n")
+            for backend in ["chars", "runs"]
+        ]
+        for view in views:
+            view.get_plain()
+
+        el = so.add_inline(begin=0, end=7, tag="yy", depth=None, attrib={})
+        so.add_inline(begin=19, end=22, tag="zz", depth=None, attrib={})
+        so.remove_inline(el)
+
+        fresh = (
+            standoffconverter.View(so)
+                .exclude_inside("xx")
+                .insert_tag_text("lb", "\n")
+        )
+        plain = fresh.get_plain()
+        for view in views:
+            self.assertTrue(view.get_plain() == plain)
+            self.assertTrue(
+                list(view.get_table_index_many(range(len(plain))))
+                == list(fresh.get_table_index_many(range(len(plain))))
+            )
+
+    def test_view_fork(self):
+        tree = etree.fromstring(input_xml1)
+        so = standoffconverter.Standoff(tree)
+        so.add_inline(begin=2, end=5, tag="xx", depth=None, attrib={})
+
+        for backend in ["chars", "runs"]:
+            base = standoffconverter.View(so, backend=backend).insert_tag_text("lb", "\n")
+            plain = base.get_plain()
+            without_xx = base.fork().exclude_inside("xx")
+            shrunk = base.fork().shrink_whitespace()
+
+            self.assertTrue(base.get_plain() == plain)
+            self.assertTrue(without_xx.get_plain() == plain[:2] + plain[5:])
+            self.assertTrue(
+                shrunk.get_plain()
+                == standoffconverter.View(so, backend=backend)
+                    .insert_tag_text("lb", "\n")
+                    .shrink_whitespace()
+                    .get_plain()
+            )
+
+        fork = base.fork()
+        self.assertTrue(fork.store.plain is base.store.plain and fork.store.row_lengths is base.store.row_lengths)
+
+        base = standoffconverter.View(so)
+        fork = base.fork()
+        self.assertTrue(np.shares_memory(
+            fork.view.table_position.values, base.view.table_position.values
+        ))
+        fork.view.loc[0, "char"] = "x"
+        self.assertTrue(fork.invalidate().get_plain() == "x" + base.get_plain())
+
+    def test_from_file(self):
+        for xml in [input_xml1, input_xml4, input_xml5, input_xml6]:
+            so = standoffconverter.Standoff(etree.fromstring(xml))
+            so_streamed = standoffconverter.Standoff.from_file(io.BytesIO(xml))
+
+            self.assertTrue(so_streamed.plain == so.plain)
+            self.assertTrue(
+                so_streamed.table.df.drop(columns="el").equals(so.table.df.drop(columns="el"))
+            )
+            self.assertTrue(etree.tostring(so_streamed.tree) == etree.tostring(so.tree))
+
+    def test_from_file_header(self):
+        xml = (
+            b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+            b'<title>T</title></titleStmt></fileDesc></teiHeader>\n<text><body><p>a<lb/>b</p></body></text></TEI>'
+        )
+        namespaces = {"tei": "http://www.tei-c.org/ns/1.0"}
+
+        so = standoffconverter.Standoff.from_file(io.BytesIO(xml), namespaces=namespaces, header="lazy")
+        self.assertTrue(len(so.tei_tree[0]) == 0)
+        so.add_inline(begin=0, end=1, tag="{http://www.tei-c.org/ns/1.0}hi", depth=None, attrib={})
+        self.assertTrue(etree.tostring(so.tree) == xml.replace(b"<p>a", b"<p><hi>a</hi>"))
+
+        so = standoffconverter.Standoff.from_file(io.BytesIO(xml), namespaces=namespaces, header="skip")
+        self.assertTrue(len(so.tree[0]) == 0 and so.plain == "ab")
+
+        with self.assertRaises(ValueError):
+            standoffconverter.Standoff.from_file(io.BytesIO(xml), header="unknown")
+        with self.assertRaises(ValueError):
+            standoffconverter.Standoff.from_file(io.BytesIO(xml))
+
+    def test_deeply_nested(self):
+        tree = etree.fromstring(input_xml1)
+        el = tree.find(".//p")
+        for _ in range(3000):
+            el = etree.SubElement(el, "hi")
+        el.text = "x"
+
+        so = standoffconverter.Standoff(tree)
+        self.assertTrue(so.plain == "1 2 3 4 5 6 7 9 10x 11 12 13 14")
+        self.assertTrue(so.table.get_span(el)[2] == 3002)
+
+    def test_compact_table(self):
+
+        for engine in ["pandas", "columnar"]:
+            so = standoffconverter.Standoff(etree.fromstring(input_xml1), engine=engine)
+            so.add_inline(begin=2, end=3, tag="vv", depth=None, attrib={})
+            so.add_inline_many([(7, 7, "lb"), (0, 5, "xx")])
+
+            df = so.table.df
+            self.assertTrue(df.position.dtype == np.int64)
+            self.assertTrue(df.row_type.dtype == "category" and str(df.depth.dtype) == "Int16")
+            self.assertTrue(so.table._row_types().dtype == np.int8)
+            self.assertTrue(list(df.depth.isna()) == list(df.row_type == "text"))
+
+            rows = list(so.table)
+            self.assertTrue(all(isinstance(row[1], str) for row in rows))
+            self.assertTrue([row[1] for row in rows] == list(so.table._column("row_type")))
+            self.assertTrue(so.table.get_span(so.text_el)[2] == 0)
+
+    def test_text_buffer(self):
+
+        for engine in ["pandas", "columnar"]:
+            so = standoffconverter.Standoff(etree.fromstring(input_xml1), engine=engine)
+            so.add_inline_many([(2, 3, "vv"), (7, 7, "lb"), (0, 5, "xx")])
+            so.remove_inline([it["el"] for it in so.standoffs if it["el"].tag == "vv"][0])
+
+            texts = [text for _, row_type, _, _, text in so.table if row_type == "text"]
+            self.assertTrue("".join(texts) == so.plain)
+            self.assertTrue(texts[:3] == ["1 2 3", " 4", " 5 6 7 9 10"])
+            self.assertTrue(list(so.table.df.text) == list(so.table._column("text")))
+
+        self.assertTrue("text" not in so.table.columns)
+
+    def test_table_cache(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = standoffconverter.TableCache(directory)
+            for engine in ["pandas", "columnar"]:
+                sos = [
+                    standoffconverter.Standoff.from_file(io.BytesIO(input_xml5), engine=engine, cache=cache)
+                    for _ in range(2)
+                ]
+                self.assertTrue(len(os.listdir(directory)) == 1)
+                self.assertTrue(sos[0].table.df.drop(columns="el").equals(sos[1].table.df.drop(columns="el")))
+                for so in sos:
+                    so.add_inline(begin=12, end=14, tag="xx", depth=None, attrib={})
+                self.assertTrue(etree.tostring(sos[0].tree) == etree.tostring(sos[1].tree))
+
+            key = cache.key(input_xml5, "text")
+            self.assertTrue(key in cache and cache.key(input_xml5, "{http://www.tei-c.org/ns/1.0}text") != key)
+            so = standoffconverter.Standoff.from_file(io.BytesIO(input_xml5), namespaces={"tei": ""}, cache=cache)
+            self.assertTrue(len(os.listdir(directory)) == 1)
+
+            # an incomplete file is a miss and is replaced
+            np.savez(os.path.join(directory, key + ".npz"), plain=np.zeros(0, dtype=np.uint8))
+            self.assertTrue(cache.load(key) is None)
+            so = standoffconverter.Standoff.from_file(io.BytesIO(input_xml5), cache=cache)
+            self.assertTrue(so.plain == sos[0].plain and cache.load(key) is not None)
+
+            so = standoffconverter.Standoff.from_file(io.BytesIO(input_xml1), cache=directory)
+            self.assertTrue(so.plain == '1 2 3 4 5 6 7 9 10 11 12 13 14')
+            self.assertTrue(len(os.listdir(directory)) == 2)
+
+            # only the most recently used table fits
+            key1 = cache.key(input_xml1, "text")
+            cache.max_bytes = os.path.getsize(os.path.join(directory, key1 + ".npz")) + 1
+            cache.evict()
+            self.assertTrue(key not in cache and key1 in cache)
+
+            with self.assertRaises(ValueError):
+                standoffconverter.TableCache(directory, max_bytes=0)
 
 
 if __name__ == '__main__':
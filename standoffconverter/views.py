@@ -1,30 +1,31 @@
 from copy import deepcopy as dc
+import copy
+import functools
 import pandas as pd
 import numpy as np
 
 from lxml import etree
 from tqdm import tqdm
 
+from .runs import RunStore, union_intervals, complement_intervals, covered_by
 
-class View:
-    """Prepare the plain text of a Standoff table for processing with NLP libraries without
-    losing the information of where the characters came from within the Standoff table. Typical use cases are removal of <notes> or insertion of newlines for encoded newlines (`<lb>`).
-    """
-    def __init__(self, so):
-
-        self.table = so.table.df
-        self.view = self.__create_view()
-        self.begins = self.table.row_type=='open'
-        self.ends = self.table.row_type=='close'
 
+class CharStore:
+    """View backend with one DataFrame row per character of the text rows and one per element row."""
+    def __init__(self, table, plain):
+        self.plain = plain
+        self.view = self.__create_view(table)
+        self.version = 0
+        self.segments_ = (-1, None)
 
-    def __create_view(self):
+    def __create_view(self, table):
 
         result = []
+        text_ends = np.append(table.position.values[1:], len(self.plain))
 
-        for irow, row in tqdm(self.table.iterrows(), desc="create view", total=len(self.table)):
-            if row.text is not None:
-                for ichar, char in enumerate(row.text):
+        for irow, row in tqdm(table.iterrows(), desc="create view", total=len(table)):
+            if row.row_type == "text":
+                for ichar, char in enumerate(self.plain[row.position:text_ends[irow]]):
                     result.append({
                         "table_index": irow,
                         "table_position": row.position+ichar,
@@ -45,6 +46,226 @@ class View:
 
         return pd.DataFrame(result)
 
+    def fork(self):
+        """a copy that shares all columns of the DataFrame except for "char"."""
+        forked = copy.copy(self)
+        forked.view = self.view.copy(deep=False)
+        forked.view["char"] = self.view.char.values.copy()
+        return forked
+
+    def update(self, table):
+        """switch to a new version of the position table with the same text but other element rows, see `RunStore.update`."""
+        old = self.view
+        is_text = (old.row_type == "text").values
+        slot_texts = {
+            (el, row_type): char
+            for el, row_type, char in zip(old.el[~is_text], old.row_type[~is_text], old.char[~is_text])
+            if char != ""
+        }
+
+        # the characters keep their changes and move to the text row that now holds their position
+        positions = table.position.values
+        text_rows = np.flatnonzero(
+            (table.row_type == "text").values & (np.diff(positions, append=len(self.plain)) > 0)
+        )
+        text_positions = positions[text_rows].astype(np.int64)
+        chars = old[is_text].copy()
+        chars["table_index"] = text_rows[
+            np.searchsorted(text_positions, chars.table_position.values, side="right") - 1
+        ]
+
+        element_rows = np.flatnonzero((table.row_type != "text").values)
+        elements = pd.DataFrame({
+            "table_index": element_rows,
+            "table_position": table.position.values[element_rows],
+            "el": table.el.values[element_rows],
+            "row_type": table.row_type.values[element_rows],
+            "char": [
+                slot_texts.get(key, "")
+                for key in zip(table.el.values[element_rows], table.row_type.values[element_rows])
+            ],
+            "char_immutable": "",
+        })
+
+        view = pd.concat([elements, chars], ignore_index=True)
+        order = np.lexsort((view.table_position.values, view.table_index.values))
+        self.view = view.iloc[order].reset_index(drop=True)
+        self.version += 1
+
+    def __rows_mask(self, ranges):
+        return covered_by(self.view.table_index.values, union_intervals(ranges))
+
+    def clear(self, ranges, slots=True):
+        """set all characters of the rows in the [begin, end) row ranges to "". If `slots` is False, only text rows are changed."""
+        mask = self.__rows_mask(ranges)
+        if not slots:
+            mask = np.logical_and(mask, self.view.row_type=='text')
+        self.view.loc[mask, 'char'] = ""
+        self.version += 1
+
+    def reset_text(self, ranges):
+        """set all characters of the text rows in the [begin, end) row ranges back to their original value."""
+        mask = np.logical_and(self.__rows_mask(ranges), self.view.row_type=='text')
+        self.view.loc[mask, "char"] = self.view.loc[mask, "char_immutable"]
+        self.version += 1
+
+    def set_rows(self, rows, texts):
+        """set the character of the element rows `rows` to `texts` (one str for all rows or one per row)."""
+        texts = pd.Series(texts, index=rows, dtype=object)
+        mask = np.logical_and(self.view.table_index.isin(rows), self.view.row_type != 'text').values
+        chars = self.view.char.values.copy()
+        chars[mask] = texts[self.view.table_index.values[mask]].values
+        self.view["char"] = chars
+        self.version += 1
+
+    def replace(self, plain_indices, values):
+        """replace the characters that produced the characters at `plain_indices` of the plain text by `values`."""
+        starts, _, _, _, _, _ = self.segments()
+        view_rows = np.flatnonzero(self.view.char.str.len().values > 0)
+        isegs = np.searchsorted(starts, np.asarray(plain_indices, dtype=np.int64), side="right") - 1
+        chars = self.view.char.values.copy()
+        chars[view_rows[isegs]] = values
+        self.view["char"] = chars
+        self.version += 1
+
+    def segments(self):
+        """(starts, texts, table_indices, table_positions, widths, steps) of the pieces of the plain text, see `RunStore.segments`."""
+        if self.segments_[0] != self.version:
+            kept = self.view[self.view.char.str.len() > 0]
+            widths = kept.char.str.len().values.astype(np.int64)
+            self.segments_ = (self.version, (
+                np.cumsum(widths) - widths,
+                list(kept.char),
+                kept.table_index.values.astype(np.int64),
+                kept.table_position.values.astype(np.int64),
+                widths,
+                np.zeros(len(kept), dtype=np.int64),
+            ))
+        return self.segments_[1]
+
+    def frame(self):
+        return self.view
+
+
+def planned(method):
+    """let a filter of the View be recorded in the plan of a lazy View instead of being applied right away."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.lazy:
+            self.plan_.append((method.__name__, args, kwargs))
+            return self
+        self.update()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+VIEW_BACKENDS = {
+    "chars": CharStore,
+    "runs": RunStore,
+}
+
+
+class View:
+    """Prepare the plain text of a Standoff table for processing with NLP libraries without
+    losing the information of where the characters came from within the Standoff table. Typical use cases are removal of <notes> or insertion of newlines for encoded newlines (`<lb>`).
+    """
+    def __init__(self, so, backend="chars", lazy=False):
+        """Create a View of a Standoff object.
+
+        arguments:
+            so (Standoff): the Standoff object.
+            backend (str): how the characters of the view are stored. "chars" keeps a DataFrame with one row per character (available as `view`), "runs" keeps one run per row of the position table and only stores the changes, so that memory grows with the number of rows rather than with the number of characters.
+            lazy (bool): if True, the filters are only recorded and applied together as soon as the plain text or a position is requested.
+        """
+        if backend not in VIEW_BACKENDS:
+            raise ValueError(f"unknown view backend {backend}, choose one of {list(VIEW_BACKENDS)}.")
+
+        self.so = so
+        self.position_table = so.table
+        self.table = so.table.df
+        self.table_version_ = so.table.version
+        self.store = VIEW_BACKENDS[backend](self.table, self.position_table.get_text())
+        self.begins = self.table.row_type=='open'
+        self.ends = self.table.row_type=='close'
+        self.cache_ = {}
+        self.lazy = lazy
+        self.plan_ = []
+
+    @property
+    def view(self):
+        """DataFrame with one row per character of the view (built on access for the "runs" backend)."""
+        self.run_plan()
+        return self.store.frame()
+
+    def update(self):
+        """bring the View up to date with the position table of its Standoff after annotations were added or removed. The filters that were already applied and the changed characters are kept. This is done automatically before the View is read or filtered.
+
+        returns:
+            self (standoffconverter.View) for chainability.
+        """
+        if self.position_table is not self.so.table or self.table_version_ != self.so.table.version:
+            self.position_table = self.so.table
+            self.table = self.position_table.df
+            self.table_version_ = self.position_table.version
+            self.begins = self.table.row_type=='open'
+            self.ends = self.table.row_type=='close'
+            self.store.update(self.table)
+        return self
+
+    def fork(self):
+        """an independent copy of the View with all filters applied so far. The copy shares the characters and positions with this View and only stores its own changes, so that several differently filtered Views of the same Standoff cost little more memory than one.
+
+        returns:
+            view (standoffconverter.View).
+        """
+        forked = copy.copy(self)
+        forked.store = self.store.fork()
+        forked.cache_ = dict(self.cache_)
+        forked.plan_ = list(self.plan_)
+        return forked
+
+    def run_plan(self):
+        """apply the filters that were recorded by a lazy View.
+
+        returns:
+            self (standoffconverter.View) for chainability.
+        """
+        self.update()
+        plan, self.plan_ = self.plan_, []
+        for name, args, kwargs in plan:
+            getattr(View, name).__wrapped__(self, *args, **kwargs)
+        return self
+
+    def invalidate(self):
+        """drop the cached plain text and offsets. The filters do this on their own, it is only needed after the DataFrame `view` of the "chars" backend was changed directly.
+
+        returns:
+            self (standoffconverter.View) for chainability.
+        """
+        self.store.version += 1
+        return self
+
+    def __segments(self):
+        self.run_plan()
+        return self.store.segments()
+
+    def __cached(self, name, compute):
+        """the value `compute(segments)`, computed once per version of the store."""
+        segments = self.__segments()
+        version, value = self.cache_.get(name, (None, None))
+        if version != self.store.version:
+            value = compute(segments)
+            self.cache_[name] = (self.store.version, value)
+        return value
+
+    def __segments_at(self, plain_text_indices):
+        starts, texts, _, _, _, _ = self.__segments()
+        plain_text_indices = np.asarray(plain_text_indices, dtype=np.int64)
+        length = starts[-1] + len(texts[-1]) if len(texts) > 0 else 0
+        if np.any((plain_text_indices < 0) | (plain_text_indices >= length)):
+            raise ValueError(f"plain text indices must be within [0, {length}).")
+        return plain_text_indices, np.searchsorted(starts, plain_text_indices, side="right") - 1
+
     def get_plain(self):
         """Plain text of the current status of the view. The plain text output by this function is meant to be inserted into an NLP pipeline. The results of the NLP pipeline will be made on the character level of this sequence. In order to create an annotation within the original TEI, the positions within the TEI that corresponds to the character positions in this plain text sequence can be looked up like this:
         `view.get_table_pos(plain_text_pos)`.
@@ -52,7 +273,7 @@ class View:
         returns:
             plain (str)-- the plain text str with all modifications applied.
         """
-        return "".join(self.view.char)
+        return self.__cached("plain", lambda segments: "".join(segments[1]))
 
     def get_table_pos(self, plain_text_index):
         """the position value within Standoff Table for a given character position. This position can differ from the one in the plain text due to added or removed characters in the plain text (such as multiple whitespace removal or addition of whitespaces at encoded whitespace positions (`<lb/>`)).
@@ -63,8 +284,20 @@ class View:
         returns:
             table_position (int).
         """
-        index = (self.view.char.apply(len).cumsum()-1==plain_text_index).argmax()
-        return self.view.iloc[index].table_position
+        return self.get_table_pos_many([plain_text_index])[0]
+
+    def get_table_pos_many(self, plain_text_indices):
+        """vectorized version of `get_table_pos` for many character positions at once, e.g. all entity offsets of an NLP pipeline.
+
+        arguments:
+        plain_text_indices (array-like of int)-- character positions in the plain text output of the view
+
+        returns:
+            table_positions (numpy.ndarray of int).
+        """
+        starts, _, _, table_positions, widths, steps = self.__segments()
+        plain_text_indices, isegs = self.__segments_at(plain_text_indices)
+        return table_positions[isegs] + steps[isegs] * ((plain_text_indices - starts[isegs]) // widths[isegs])
 
     def get_table_index(self, plain_text_index):
         """the table_index value for a given character position.
@@ -75,102 +308,182 @@ class View:
         returns:
             table index (int).
         """
-        index = (self.view.char.apply(len).cumsum()-1==plain_text_index).argmax()
-        return self.view.iloc[index].table_index
+        return self.get_table_index_many([plain_text_index])[0]
+
+    def get_table_index_many(self, plain_text_indices):
+        """vectorized version of `get_table_index` for many character positions at once.
+
+        arguments:
+        plain_text_indices (array-like of int)-- character positions in the plain text output of the view
+
+        returns:
+            table indices (numpy.ndarray of int).
+        """
+        _, isegs = self.__segments_at(plain_text_indices)
+        return self.__segments()[2][isegs]
+
+    def __text_segments(self):
+        """(starts, table_positions, widths, steps, last_table_positions) of the segments that come from text rows, i.e. without the texts inserted for element rows."""
+        def compute(segments):
+            starts, texts, table_indices, table_positions, widths, steps = segments
+            text = np.flatnonzero(np.asarray(self.table.row_type)[table_indices] == "text")
+            n_chars = np.array([len(texts[iseg]) for iseg in text.tolist()], dtype=np.int64) // widths[text]
+            last_table_positions = table_positions[text] + steps[text] * (n_chars - 1)
+            return starts[text], table_positions[text], widths[text], steps[text], last_table_positions
+        return self.__cached("text_segments", compute)
+
+    def get_plain_pos(self, table_position, snap="next"):
+        """the character position in the plain text for a given position within the Standoff Table, i.e. the inverse of `get_table_pos`. Texts inserted for elements (see `insert_tag_text`) are skipped.
+
+        arguments:
+        table_position (int)-- position within the Standoff Table
+        snap (str)-- what to return if the character at `table_position` is not part of the plain text (e.g. because it was excluded): "next" returns the position of the next character of the plain text (or the length of the plain text if there is none), "previous" the position of the previous one (or -1 if there is none) and None raises a ValueError.
+
+        returns:
+            plain_text_index (int).
+        """
+        return self.get_plain_pos_many([table_position], snap=snap)[0]
 
-    def iter_indices_inside(self, tag_or_callable=None):
+    def get_plain_pos_many(self, table_positions, snap="next"):
+        """vectorized version of `get_plain_pos` for many table positions at once, e.g. the begins and ends of existing annotations.
 
+        arguments:
+        table_positions (array-like of int)-- positions within the Standoff Table
+        snap (str)-- see `get_plain_pos`.
+
+        returns:
+            plain_text_indices (numpy.ndarray of int).
+        """
+        if snap not in ("next", "previous", None):
+            raise ValueError(f"snap has to be one of 'next', 'previous' or None, not {snap}.")
+
+        all_starts, texts, _, _, _, _ = self.__segments()
+        length = all_starts[-1] + len(texts[-1]) if len(texts) > 0 else 0
+        starts, segment_positions, widths, steps, last_table_positions = self.__text_segments()
+        table_positions = np.asarray(table_positions, dtype=np.int64)
+
+        # the first segment with characters of the text at or after the table position
+        isegs = np.searchsorted(last_table_positions, table_positions, side="left")
+        found = isegs < len(starts)
+        isegs_found = isegs[found]
+        offsets = np.maximum(table_positions[found] - segment_positions[isegs_found], 0)
+        offsets[steps[isegs_found] == 0] = 0
+
+        result = np.full(len(table_positions), length, dtype=np.int64)
+        result[found] = starts[isegs_found] + offsets * widths[isegs_found]
+
+        exact = np.zeros(len(table_positions), dtype=bool)
+        exact[found] = segment_positions[isegs_found] + steps[isegs_found] * offsets == table_positions[found]
+
+        if snap is None and not exact.all():
+            raise ValueError(f"the characters at the table positions {list(table_positions[~exact])} are not part of the plain text.")
+        if snap == "previous":
+            result[~exact] -= 1
+        return result
+
+    def ranges_inside(self, tag_or_callable=None, attrib=None):
+        """the [begin, end) table index ranges from the open to the close row of the elements with the tag (or one of a list of tags, or for which the callable is True) as an array of shape (n, 2), in document order. Elements without rows in between are left out.
+
+        arguments:
+        tag_or_callable -- for example `'note'`, `["note", "abbr"]` or `lambda el: el.get("type") == "editorial"`
+        attrib (dict)-- only elements with all of these attribute values, for example `{"type": "editorial"}`
+
+        returns:
+            ranges (numpy.ndarray).
+        """
+        self.update()
         if callable(tag_or_callable):
-            element_mask = self.table.el.apply(tag_or_callable)
+            els = [
+                el for el, row_type in zip(self.table.el, self.table.row_type)
+                if row_type == "open" and tag_or_callable(el)
+            ]
+            if attrib is not None:
+                els = [el for el in els if all(el.get(k) == v for k, v in attrib.items())]
+            ranges = self.position_table.get_rows(els)
         else:
-            element_mask = self.table.el.apply(lambda x: x.tag == tag_or_callable if isinstance(x, etree._Element) else False)
-            
-        begins = self.table[np.logical_and(
-            element_mask,
-            self.begins
-        )]
-
-        ends = self.table[np.logical_and(
-            element_mask,
-            self.ends
-        )]
-
-        for begin, end in tqdm(zip(begins.index, ends.index), total=len(begins)):
+            tags = tag_or_callable if isinstance(tag_or_callable, (list, tuple, set)) else [tag_or_callable]
+            ranges = np.concatenate([np.zeros((0, 2), dtype=np.int64)] + [
+                self.position_table.get_rows_by_tag(tag, attrib) for tag in tags
+            ])
+            ranges = ranges[np.argsort(ranges[:, 0], kind="stable")]
+        return ranges[ranges[:, 0] < ranges[:, 1]]
+
+    def iter_indices_inside(self, tag_or_callable=None, attrib=None):
+        for begin, end in self.ranges_inside(tag_or_callable, attrib):
             yield begin, end
                
-    def exclude_outside(self, tag):
+    @planned
+    def exclude_outside(self, tag, attrib=None):
         """exclude all text outside the tag.
         
         arguments:
         tag -- for example `'note'` or `"{http://www.tei-c.org/ns/1.0}abbr"`
+        attrib (dict)-- only elements with all of these attribute values, for example `{"type": "editorial"}`
 
         returns:
             self (standoffconverter.View) for chainability.
         """
-        mask = np.ones(len(self.view), dtype=bool)
-        for begin, end in self.iter_indices_inside(tag):
-            mask[self.view.table_index.isin(np.arange(begin,end))] = False
-        self.view.loc[mask, 'char'] = ""
+        self.store.clear(complement_intervals(self.ranges_inside(tag, attrib), 0, len(self.table)))
         return self
 
-    def exclude_inside(self, tag):
+    @planned
+    def exclude_inside(self, tag, attrib=None):
         """exclude all text within the tag.
         
         arguments:
         tag -- for example `'note'` or `"{http://www.tei-c.org/ns/1.0}abbr"`
+        attrib (dict)-- only elements with all of these attribute values, for example `{"type": "editorial"}`
 
         returns:
             self (standoffconverter.View) for chainability.
         """
-        mask = np.zeros(len(self.view), dtype=bool)
-        for begin, end in self.iter_indices_inside(tag):
-            mask[self.view.table_index.isin(np.arange(begin,end))] = True
-        self.view.loc[mask, 'char'] = ""
+        self.store.clear(self.ranges_inside(tag, attrib))
         return self
 
-    def include_inside(self, tag):
+    @planned
+    def include_inside(self, tag, attrib=None):
         """include all text within the tag. It will basically reset all modifications inside the given tag. This means that for example, altered characters or shrunken whitespaces will also be reset. It does not affect any characters outside the given tags (for example, it does not exclude anything outside explicitly). Therefore, it can combined nicely with `exclude_outside`, for example view.exclude_outside("a").include_iside_("b") which will exclude everything except what is inside `<a>`s and `<b>`s.
         
         arguments:
         tag -- for example `'note'` or `"{http://www.tei-c.org/ns/1.0}abbr"`
+        attrib (dict)-- only elements with all of these attribute values, for example `{"type": "editorial"}`
 
         returns:
             self (standoffconverter.View) for chainability.
         """
-        for begin, end in self.iter_indices_inside(tag):
-            self.view.loc[
-                np.logical_and(
-                    self.view.table_index.isin(np.arange(begin,end)),
-                    self.view.row_type=='text'
-                ),
-                "char"
-            ] = self.view.loc[
-                np.logical_and(
-                    self.view.table_index.isin(np.arange(begin,end)),
-                    self.view.row_type=='text'
-                ),
-                "char_immutable"
-            ]
-           
+        self.store.reset_text(self.ranges_inside(tag, attrib))
         return self
 
-    def insert_tag_text(self, tag, text):
+    @planned
+    def insert_tag_text(self, tag, text=None):
         """insert a custom character to the plain text for all occurrences of the tag.
         
         arguments:
-        tag -- the el tag that should be replaced, for example `"{http://www.tei-c.org/ns/1.0}lb"`
-        text -- the text that the el should be replaced with.
+        tag -- the el tag that should be replaced, for example `"{http://www.tei-c.org/ns/1.0}lb"`, or a dict that maps several tags to their texts, for example `{"lb": "\\n", "pb": ""}`.
+        text -- the text that the el should be replaced with (only if `tag` is not a dict).
 
         returns:
             self (standoffconverter.View) for chainability.
         """
-        
-        for _, row in tqdm(self.view.iterrows(), desc='insert tag text', total=len(self.view)):
-            if row.el is not None and row.el.tag == tag:
-                self.view.loc[row.name, 'char'] = text
-        
+        if isinstance(tag, dict):
+            if text is not None:
+                raise ValueError("text has to be None if tag is a dict of tags and texts.")
+            mapping = tag
+        elif text is None:
+            raise ValueError("text is required for a single tag.")
+        else:
+            mapping = {tag: text}
+
+        rows = []
+        texts = []
+        for tag, text in mapping.items():
+            tag_rows = np.unique(self.position_table.get_rows_by_tag(tag))
+            rows.append(tag_rows)
+            texts += [text] * len(tag_rows)
+        self.store.set_rows(np.concatenate([np.zeros(0, dtype=np.int64)] + rows), texts)
         return self
 
+    @planned
     def shrink_whitespace(self, shrink_to=" ", custom_whitespaces=None):
         """Reduce consecutive white spaces to a single white space.
         
@@ -187,38 +500,93 @@ class View:
             whitespaces = [" ", "\t", "\n"]
         else:
             whitespaces = custom_whitespaces
-        
-        begin = None 
-        for i,row in tqdm(self.view.iterrows(), desc="shrink whitespace", total=len(self.view)):
-            if row.char in whitespaces and begin is None:
-                begin = i
-            elif (
-                row.char not in whitespaces + [""]
-                and begin is not None
-            ):
-                if len("".join(self.view[begin:i].char)) > 1: # only replace if it actually was multiple whitespaces
-                    self.view.loc[begin, 'char'] = shrink_to
-                    self.view.loc[begin+1:i-1, 'char'] = ""
-                begin = None
 
+        # white space mask over the code points of the plain text. A character only counts as
+        # white space if it is the complete text of one character of the view.
+        _, texts, _, _, widths, _ = self.store.segments()
+        plain = self.get_plain()
+        code_points = np.frombuffer(plain.encode("utf-32-le"), dtype=np.uint32)
+        whitespace_code_points = [ord(whitespace) for whitespace in whitespaces if len(whitespace) == 1]
+        is_whitespace = np.logical_and(
+            np.repeat(widths, [len(text) for text in texts]) == 1,
+            np.isin(code_points, whitespace_code_points)
+        )
+
+        # runs of white space that are followed by another character
+        changes = np.diff(np.concatenate([[0], is_whitespace.astype(np.int8), [0]]))
+        begins = np.flatnonzero(changes == 1)
+        ends = np.flatnonzero(changes == -1)
+        shrink = np.logical_and(ends - begins > 1, ends < len(plain)) # only replace if it actually was multiple whitespaces
+        begins, ends = begins[shrink], ends[shrink]
+
+        lengths = ends - begins
+        plain_indices = np.repeat(begins - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        values = np.full(len(plain_indices), "", dtype=object)
+        values[np.cumsum(lengths) - lengths] = shrink_to
+
+        self.store.replace(plain_indices, values)
         return self
 
+    @planned
     def remove_comments(self):
         """Remove comments (something like "<!-- ... -->") from plain text view.
         
         returns:
             self (standoffconverter.View) for chainability.
         """
-        for begin, end in self.iter_indices_inside(
-            lambda x: isinstance(x, etree._Comment)
-        ):
-
-            self.view.loc[
-                np.logical_and(
-                    self.view.table_index.isin(np.arange(begin,end)),
-                    self.view.row_type=='text'
-                ),
-                "char"
-            ] = ""
-        
-        return self
\ No newline at end of file
+        self.store.clear(
+            self.position_table.get_rows_by_tag(etree.Comment),
+            slots=False
+        )
+        return self
+
+class ViewPipeline:
+    """A reusable sequence of View filters that can be defined once and applied to many Standoff objects, for example:
+
+    `pipeline = ViewPipeline().exclude_inside("note").insert_tag_text("lb", "\\n").shrink_whitespace()`
+    `plain = pipeline.apply(so).get_plain()`
+    """
+    def __init__(self):
+        self.steps = []
+
+    def __add(self, name, *args):
+        self.steps.append((name, args, {}))
+        return self
+
+    def exclude_outside(self, tag, attrib=None):
+        """see `View.exclude_outside`."""
+        return self.__add("exclude_outside", tag, attrib)
+
+    def exclude_inside(self, tag, attrib=None):
+        """see `View.exclude_inside`."""
+        return self.__add("exclude_inside", tag, attrib)
+
+    def include_inside(self, tag, attrib=None):
+        """see `View.include_inside`."""
+        return self.__add("include_inside", tag, attrib)
+
+    def insert_tag_text(self, tag, text=None):
+        """see `View.insert_tag_text`."""
+        return self.__add("insert_tag_text", tag, text)
+
+    def shrink_whitespace(self, shrink_to=" ", custom_whitespaces=None):
+        """see `View.shrink_whitespace`."""
+        return self.__add("shrink_whitespace", shrink_to, custom_whitespaces)
+
+    def remove_comments(self):
+        """see `View.remove_comments`."""
+        return self.__add("remove_comments")
+
+    def apply(self, so, backend="chars"):
+        """create a lazy View of `so` with all filters of the pipeline. They are applied when the plain text or a position is requested.
+
+        arguments:
+            so (Standoff): the Standoff object.
+            backend (str): see `View.__init__`.
+
+        returns:
+            view (standoffconverter.View).
+        """
+        view = View(so, backend=backend, lazy=True)
+        view.plan_ = list(self.steps)
+        return view